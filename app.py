@@ -1,35 +1,436 @@
 import os
 import json
-from flask import Flask, jsonify, abort, request
-from models import db, setup_db, Merchant, Item, Customer
+from flask import Flask, Response, jsonify, abort, request, current_app, g
+from models import db, setup_db, bulk_insert, Merchant, Item, Customer
+from models import favorite_items_table, purchased_items_table
+from models import add_customer_items, remove_customer_item
+from models import select_customer_items, request_units_of_work
+from models import bulk_update, update_by_id, items_purchased, commit
 from flask_cors import CORS
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from werkzeug.exceptions import HTTPException
-from config import Config
-from auth import requires_auth, AuthError
+from config import get_config
+from auth import requires_auth, AuthError, AnyOf, token_cache
+from pagination import int_arg, page_args, keyset_page, fetch_all
+from pagination import sorted_keyset_query, split_page
+from streaming import stream_format, stream_response
+from fieldsets import fieldset_args, apply_fieldset, select_fieldset
+from filtering import filter_args, sort_arg, apply_filters, check_selective
+from filtering import parse_cursor, format_cursor
+from serializers import json_response, row_formatter
+from validation import validate_row, check_constraints
+from metrics import render_metrics
+from timing import init_timing
+from cache import init_cache, cached_response
+from etags import conditional_get, entity_etag, not_modified, with_etag
+from search import search_items
+
+
+# Lets a token update the items of any merchant, with ?merchant_id=
+ANY_MERCHANT_PERMISSION = 'patch:all_items'
+
+# Tables each collection listing is built from, behind its cache
+# entries and ETags
+LISTING_TABLES = {
+    'merchants': ('merchants', 'items'),
+    'items': ('items', 'merchants'),
+    'customers': ('customers', 'items', 'favorites', 'purchased'),
+}
+
+
+class CollectionListing(object):
+    '''
+    A collection listing as requested: fieldset (see fieldsets.py),
+    filters and sort order (see filtering.py) and paging (see
+    pagination.py), compiled into one query. collection_response runs
+    it on the session, asgi.py awaits it on the async engine (with
+    `entities` a select() of the model instead of an ORM Query).
+    '''
+
+    def __init__(self, model, name, entities=None):
+        self.model = model
+        self.name = name
+        fields, expand = fieldset_args(model)
+        filters = filter_args(model)
+        self.sort = sort_arg(model)
+        # Keyset pages need the sort column, even if it isn't returned
+        selected = fields
+        if self.sort is not None and \
+                self.sort[0].key not in ('id',) + tuple(fields):
+            selected = tuple(fields) + (self.sort[0].key,)
+        self.entities = bool(expand)
+        if expand:
+            # Nested relationships need ORM instances to load them
+            if entities is None:
+                entities = model.query
+            query = apply_fieldset(entities, model, selected, expand)
+
+            def format_row(row):
+                return row.format(fields, expand)
+        else:
+            # Read-only columns: plain row tuples, no identity map
+            query = select_fieldset(model, selected)
+            format_row = row_formatter(('id',) + tuple(fields))
+        self.query = apply_filters(query, filters)
+        self.format_row = format_row
+
+        self.stream = stream_format()
+        self.paging = None
+        if self.stream is not None:
+            if self.sort is not None:
+                abort(400, description='sort is not supported when '
+                                       'streaming.')
+            return
+        if self.sort is None:
+            self.paging = page_args()
+        else:
+            self.paging = page_args(lambda: parse_cursor(self.sort))
+        check_selective(filters, paged=self.paging is not None)
+
+    def statement(self):
+        '''The query of a buffered (not streamed) response'''
+        column, descending = self.sort or (self.model.id, False)
+        if self.paging is None:
+            if self.sort is None:
+                return self.query
+            return self.query.order_by(
+                column.desc() if descending else column)
+        return sorted_keyset_query(self.query, column, descending,
+                                   self.model.id, *self.paging)
+
+    def response(self, rows):
+        '''The response for the rows of statement()'''
+        if self.paging is not None:
+            column = self.sort[0] if self.sort else self.model.id
+            rows, next_cursor = split_page(
+                rows, column, self.model.id, self.paging[0])
+        response = {
+            'success': True,
+            self.name: [self.format_row(row) for row in rows]
+        }
+        if self.paging is not None:
+            response['next_cursor'] = format_cursor(next_cursor)
+        return json_response(response)
+
+
+def collection_response(model, name):
+    '''
+    Lists a collection as a full response, a keyset page or a stream
+    (see streaming.py)
+    '''
+    listing = CollectionListing(model, name)
+    if listing.stream is not None:
+        return stream_response(listing.query, model.id, name,
+                               listing.stream, listing.format_row,
+                               after=int_arg('after', 0))
+    return listing.response(fetch_all(listing.statement()))
+
+
+def entity_response(model, name, entity_id):
+    '''
+    One entity in the requested fieldset. Reads only its updated_at
+    (and the versions of expanded tables) before answering a matching
+    If-None-Match with 304
+    '''
+    fields, expand = fieldset_args(model)
+    updated_at = db.session.query(model.updated_at).filter(
+        model.id == entity_id).scalar()
+    if updated_at is None:
+        abort(404)
+    etag = entity_etag(model, updated_at, expand)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    entity = apply_fieldset(model.query, model, fields, expand).filter(
+        model.id == entity_id).one_or_none()
+    if entity is None:
+        abort(404)
+    return with_etag(json_response({
+        'success': True,
+        name: entity.format(fields, expand)
+    }), etag)
+
+
+def update_response(model, name, entity_id):
+    '''
+    Applies a PATCH body in one UPDATE returning the requested fields,
+    without loading the entity first. Only the writable columns of the
+    model are accepted. Relationships are returned only when asked for
+    with ?expand, and loaded after the update
+    '''
+    body = json.loads(request.data)
+    values, errors = validate_row(model, body, partial_update=True)
+    if errors:
+        return jsonify({
+            'success': False,
+            'status': 400,
+            'error': 'Bad Request',
+            'message': 'Invalid fields, nothing was updated.',
+            'errors': errors
+        }), 400
+    if not values:
+        abort(400, description='No fields to update.')
+    fields, expand = fieldset_args(model, default_expand=())
+
+    row = update_by_id(model, entity_id, values, fields)
+    if row is None:
+        abort(404)
+    if expand:
+        entity = apply_fieldset(model.query, model, fields, expand).filter(
+            model.id == entity_id).one()
+        formatted = entity.format(fields, expand)
+    else:
+        formatted = row_formatter(('id',) + tuple(fields))(row)
+    return jsonify({
+        'success': True,
+        name: formatted
+    })
+
+
+def bulk_create_response(model):
+    '''
+    Creates a JSON array of objects in one transaction. The whole batch
+    is validated first; by default any error rejects the batch, with
+    ?partial=true the valid rows are inserted and the others reported.
+    '''
+    body = json.loads(request.data)
+    if not isinstance(body, list):
+        abort(400, description='Request body must be a JSON array.')
+    max_rows = current_app.config['BULK_MAX_ROWS']
+    if len(body) > max_rows:
+        abort(400, description=f'At most {max_rows} objects per request.')
+    partial = request.args.get('partial', 'false').lower() == 'true'
+
+    rows = []
+    errors = {}
+    for index, data in enumerate(body):
+        values, row_errors = validate_row(model, data)
+        rows.append(values)
+        if row_errors:
+            errors[index] = row_errors
+    check_constraints(model, rows, errors)
+
+    error_list = [{'index': index, 'errors': errors[index]}
+                  for index in sorted(errors)]
+    if errors and not partial:
+        return jsonify({
+            'success': False,
+            'status': 400,
+            'error': 'Bad Request',
+            'message': 'Invalid objects in batch, nothing was created.',
+            'errors': error_list
+        }), 400
 
+    valid = [i for i in range(len(rows)) if i not in errors]
+    ids = [None] * len(rows)
+    for index, new_id in zip(valid, bulk_insert(
+            model, [rows[i] for i in valid])):
+        ids[index] = new_id
+    return jsonify({
+        'success': True,
+        'created': len(valid),
+        'ids': ids,
+        'errors': error_list
+    })
+
+
+def caller_merchant_id():
+    '''
+    The merchant a request acts for: the MERCHANT_ID_CLAIM of the
+    token. Only tokens with ANY_MERCHANT_PERMISSION may name another
+    one with the merchant_id argument
+    '''
+    requested = int_arg('merchant_id', 1)
+    if requested is not None:
+        if ANY_MERCHANT_PERMISSION not in g.permissions:
+            abort(403, description='merchant_id needs the '
+                                   f'{ANY_MERCHANT_PERMISSION} permission.')
+        return requested
+    claim = current_app.config['MERCHANT_ID_CLAIM']
+    owned = g.jwt_payload.get(claim)
+    if owned is None:
+        abort(403, description='The token has no merchant.')
+    try:
+        if isinstance(owned, bool):
+            raise ValueError()
+        return int(owned)
+    except (TypeError, ValueError):
+        abort(403, description='The merchant of the token is not an '
+                               'integer.')
+
+
+def owned_ids(owner_column, owner_id, ids, chunk_size=1000):
+    '''The ids among `ids` of the rows whose owner_column is owner_id'''
+    table = owner_column.table
+    ids = sorted(ids)
+    owned = set()
+    for start in range(0, len(ids), chunk_size):
+        owned.update(db.session.execute(
+            select(table.c.id).where(
+                owner_column == owner_id,
+                table.c.id.in_(ids[start:start + chunk_size]))).scalars())
+    return owned
+
+
+def bulk_update_response(model, owner_column, owner_id):
+    '''
+    Applies a JSON array of {id, ...fields} objects in one transaction,
+    to rows whose owner_column is owner_id only. Validated and reported
+    like bulk_create_response: by default any error rejects the batch,
+    with ?partial=true the valid objects are applied. The results give
+    for each object, in order, its id and whether it was updated.
+    '''
+    body = json.loads(request.data)
+    if not isinstance(body, list):
+        abort(400, description='Request body must be a JSON array.')
+    max_rows = current_app.config['BULK_UPDATE_MAX_ROWS']
+    if len(body) > max_rows:
+        abort(400, description=f'At most {max_rows} objects per request.')
+    partial = request.args.get('partial', 'false').lower() == 'true'
+
+    rows = []
+    errors = {}
+    ids = set()
+    for index, data in enumerate(body):
+        if not isinstance(data, dict):
+            rows.append({'id': None})
+            errors[index] = {'': 'must be an object'}
+            continue
+        data = dict(data)
+        entity_id = data.pop('id', None)
+        values, row_errors = validate_row(model, data, partial_update=True)
+        if owner_column.key in data:
+            row_errors[owner_column.key] = 'may not be changed'
+        elif not values and not row_errors:
+            row_errors[''] = 'no fields to update'
+        if entity_id is None:
+            row_errors['id'] = 'is required'
+        elif isinstance(entity_id, bool) or not isinstance(entity_id, int):
+            row_errors['id'] = 'must be an integer'
+        elif entity_id in ids:
+            row_errors['id'] = 'appears more than once'
+        else:
+            ids.add(entity_id)
+        rows.append(dict(values, id=entity_id))
+        if row_errors:
+            errors[index] = row_errors
+
+    def not_found(ids):
+        # Unknown ids and other merchants' items alike
+        for index, row in enumerate(rows):
+            if index not in errors and row['id'] not in ids:
+                errors[index] = {'id': 'not found'}
+
+    def error_list():
+        return [{'index': index, 'id': rows[index]['id'],
+                 'errors': errors[index]} for index in sorted(errors)]
+
+    def rejected():
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'status': 400,
+            'error': 'Bad Request',
+            'message': 'Invalid objects in batch, nothing was updated.',
+            'errors': error_list()
+        }), 400
 
-def create_app(config=Config):
+    not_found(owned_ids(owner_column, owner_id, ids))
+    if errors and not partial:
+        return rejected()
+
+    valid = [row for index, row in enumerate(rows) if index not in errors]
+    # Rows deleted or moved since owned_ids are not updated
+    updated = bulk_update(model, valid, where=owner_column == owner_id)
+    not_found(updated)
+    if errors and not partial:
+        return rejected()
+    commit()
+    return json_response({
+        'success': True,
+        'updated': len(updated),
+        'results': [{'id': row['id'],
+                     'updated': index not in errors and row['id'] in updated}
+                    for index, row in enumerate(rows)],
+        'errors': error_list()
+    })
+
+
+def item_ids_arg():
+    '''The item_ids list of a request body, deduplicated and sorted'''
+    body = json.loads(request.data)
+    item_ids = body.get('item_ids') if isinstance(body, dict) else None
+    if not isinstance(item_ids, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool)
+            for i in item_ids):
+        abort(400, description='item_ids must be a list of item ids.')
+    max_rows = current_app.config['BULK_MAX_ROWS']
+    if len(item_ids) > max_rows:
+        abort(400, description=f'At most {max_rows} item ids per request.')
+    # A consistent order keeps concurrent inserts from deadlocking
+    return sorted(set(item_ids))
+
+
+def customer_items_response(table, name, customer_id):
+    '''Lists a customer's favorites or purchases, optionally paged'''
+    fields, expand = fieldset_args(Item)
+    if expand:
+        abort(400, description=f'expand is not supported on {name}.')
+    query = select_customer_items(table, customer_id, fields)
+
+    paging = page_args()
+    if paging is None:
+        rows = fetch_all(query.order_by(Item.id))
+    else:
+        rows, next_cursor = keyset_page(query, Item.id, *paging)
+    # Only an empty list needs to tell a missing customer apart
+    if not rows and Customer.query.get(customer_id) is None:
+        abort(404)
+
+    format_row = row_formatter(('id',) + tuple(fields))
+    response = {
+        'success': True,
+        'customer_id': customer_id,
+        name: [format_row(row) for row in rows]
+    }
+    if paging is not None:
+        response['next_cursor'] = next_cursor
+    return json_response(response)
+
+
+def create_app(config=None):
 
     app = Flask(__name__)
+    if config is None:
+        config = get_config()
     setup_db(app, config)
+    init_cache(app)
+    init_timing(app)
     CORS(app)
 
     @app.route('/', methods=['GET'])
     def hello():
         return "Welcome to SideBoard!"
 
+    if app.config.get('METRICS_ENABLED'):
+        @app.route('/metrics', methods=['GET'])
+        @requires_auth(permission='get:metrics')
+        def metrics():
+            return Response(render_metrics(db.engine, token_cache.stats()),
+                            mimetype='text/plain; version=0.0.4')
+
 # MERCHANTS
 
     @app.route('/merchants', methods=['GET'])
     @requires_auth(permission='get:merchants')
+    @cached_response(*LISTING_TABLES['merchants'])
+    @conditional_get(*LISTING_TABLES['merchants'])
     def get_merchants():
-        merchants = Merchant.query.all()
-        formatted_merchants = [merchant.format() for merchant in merchants]
-        return jsonify({
-            'success': True,
-            'merchants': formatted_merchants
-        })
+        # Expanded items come from one extra SELECT ... WHERE merchant_id
+        # IN (...), instead of one lazy load per merchant
+        return collection_response(Merchant, 'merchants')
 
     @app.route('/merchants', methods=['POST'])
     @requires_auth(permission='create:merchants')
@@ -42,45 +443,66 @@ def create_app(config=Config):
             'merchant': merchant.format()
         })
 
+    @app.route('/merchants/bulk', methods=['POST'])
+    @requires_auth(permission='create:merchants')
+    def create_merchants_bulk():
+        return bulk_create_response(Merchant)
+
+    @app.route('/merchants/<int:merchant_id>', methods=['GET'])
+    @requires_auth(permission='get:merchants')
+    def get_merchant(merchant_id):
+        return entity_response(Merchant, 'merchant', merchant_id)
+
     @app.route('/merchants/<int:merchant_id>', methods=['PATCH'])
     @requires_auth(permission='patch:merchants')
     def edit_merchant(merchant_id):
-        merchant = Merchant.query.filter(
-            Merchant.id == merchant_id).one_or_none()
-        if not merchant:
-            abort(404)
-
-        body = json.loads(request.data)
         # PATCH: Update only the fields found in the request
-        merchant.update(**body)
-        return jsonify({
-            'success': True,
-            'merchant': merchant.format()
-        })
+        return update_response(Merchant, 'merchant', merchant_id)
 
     @app.route('/merchants/<int:merchant_id>', methods=['DELETE'])
     @requires_auth(permission='delete:merchants')
     def delete_merchant(merchant_id):
-        merchant = Merchant.query.get(merchant_id)
-        if not merchant:
+        if items_purchased(Item.merchant_id == merchant_id):
+            abort(409, description='Items of this merchant were '
+                                   'purchased.')
+        # Items are removed with bulk statements, nothing is loaded into
+        # the session
+        deleted_items = Merchant.delete_by_id(merchant_id)
+        if deleted_items is None:
             abort(404)
-        merchant.delete()
         return jsonify({
             'success': True,
-            'merchant': merchant.format()
+            'merchant': {'id': merchant_id},
+            'deleted_items': deleted_items
         })
 
 # ITEMS
 
     @app.route('/items', methods=['GET'])
     @requires_auth(permission='get:items')
+    @cached_response(*LISTING_TABLES['items'])
+    @conditional_get(*LISTING_TABLES['items'])
     def get_items():
-        items = Item.query.all()
-        formatted_items = [item.format() for item in items]
-        return jsonify({
+        return collection_response(Item, 'items')
+
+    @app.route('/items/search', methods=['GET'])
+    @requires_auth(permission='get:items')
+    @cached_response('items', 'merchants')
+    @conditional_get('items', 'merchants')
+    def search_items_view():
+        fields, expand = fieldset_args(Item)
+        if expand:
+            abort(400, description='expand is not supported by search.')
+        rows, next_cursor, facets = search_items(fields)
+        keys = ('id',) + tuple(fields) + ('rank',)
+        response = {
             'success': True,
-            'items': formatted_items
-        })
+            'items': [dict(zip(keys, row)) for row in rows],
+            'next_cursor': next_cursor
+        }
+        if facets:
+            response['facets'] = facets
+        return json_response(response)
 
     @app.route('/items', methods=['POST'])
     @requires_auth(permission='create:items')
@@ -93,19 +515,26 @@ def create_app(config=Config):
             'item': item.format()
         })
 
+    @app.route('/items/bulk', methods=['POST'])
+    @requires_auth(permission='create:items')
+    def create_items_bulk():
+        return bulk_create_response(Item)
+
+    @app.route('/items/<int:item_id>', methods=['GET'])
+    @requires_auth(permission='get:items')
+    def get_item(item_id):
+        return entity_response(Item, 'item', item_id)
+
+    @app.route('/items/bulk', methods=['PATCH'])
+    @requires_auth(permission='patch:items')
+    def edit_items_bulk():
+        return bulk_update_response(Item, Item.merchant_id,
+                                    caller_merchant_id())
+
     @app.route('/items/<int:item_id>', methods=['PATCH'])
     @requires_auth(permission='patch:items')
     def edit_item(item_id):
-        item = Item.query.filter(Item.id == item_id).one_or_none()
-        if not item:
-            abort(404)
-
-        body = json.loads(request.data)
-        item.update(**body)
-        return jsonify({
-            'success': True,
-            'item': item.format()
-        })
+        return update_response(Item, 'item', item_id)
 
     @app.route('/items/<int:item_id>', methods=['DELETE'])
     @requires_auth(permission='delete:items')
@@ -113,6 +542,8 @@ def create_app(config=Config):
         item = Item.query.get(item_id)
         if not item:
             abort(404)
+        if items_purchased(Item.id == item_id):
+            abort(409, description='The item was purchased.')
         item.delete()
         return jsonify({
             'success': True,
@@ -123,13 +554,10 @@ def create_app(config=Config):
 
     @app.route('/customers', methods=['GET'])
     @requires_auth(permission='get:customers')
+    @cached_response(*LISTING_TABLES['customers'])
+    @conditional_get(*LISTING_TABLES['customers'])
     def get_customers():
-        customers = Customer.query.all()
-        formatted_customers = [cust.format() for cust in customers]
-        return jsonify({
-            'success': True,
-            'customers': formatted_customers
-        })
+        return collection_response(Customer, 'customers')
 
     @app.route('/customers', methods=['POST'])
     @requires_auth(permission='create:customers')
@@ -142,20 +570,20 @@ def create_app(config=Config):
             'customer': customer.format()
         })
 
+    @app.route('/customers/bulk', methods=['POST'])
+    @requires_auth(permission='create:customers')
+    def create_customers_bulk():
+        return bulk_create_response(Customer)
+
+    @app.route('/customers/<int:customer_id>', methods=['GET'])
+    @requires_auth(permission='get:customers')
+    def get_customer(customer_id):
+        return entity_response(Customer, 'customer', customer_id)
+
     @app.route('/customers/<int:customer_id>', methods=['PATCH'])
     @requires_auth(permission='patch:customers')
     def edit_customer(customer_id):
-        customer = Customer.query.filter(
-            Customer.id == customer_id).one_or_none()
-        if not customer:
-            abort(404)
-
-        body = json.loads(request.data)
-        customer.update(**body)
-        return jsonify({
-            'success': True,
-            'customer': customer.format()
-        })
+        return update_response(Customer, 'customer', customer_id)
 
     @app.route('/customers/<int:customer_id>', methods=['DELETE'])
     @requires_auth(permission='delete:customers')
@@ -163,10 +591,77 @@ def create_app(config=Config):
         customer = Customer.query.get(customer_id)
         if not customer:
             abort(404)
+        # Favorites and purchases rows are deleted with the customer, so
+        # format before they disappear
+        formatted = customer.format()
         customer.delete()
         return jsonify({
             'success': True,
-            'customer': customer.format()
+            'customer': formatted
+        })
+
+# CUSTOMER FAVORITES AND PURCHASES
+
+    @app.route('/customers/<int:customer_id>/favorites', methods=['GET'])
+    @requires_auth(permission=AnyOf('get:favorites', 'get:customers'))
+    @conditional_get('favorites', 'items')
+    def get_favorites(customer_id):
+        return customer_items_response(
+            favorite_items_table, 'favorites', customer_id)
+
+    @app.route('/customers/<int:customer_id>/favorites', methods=['POST'])
+    @requires_auth(permission=AnyOf('create:favorites', 'patch:customers'))
+    def add_favorites(customer_id):
+        added = add_customer_items(
+            favorite_items_table, customer_id, item_ids_arg())
+        return jsonify({
+            'success': True,
+            'customer_id': customer_id,
+            'added': added
+        })
+
+    @app.route('/customers/<int:customer_id>/favorites/<int:item_id>',
+               methods=['DELETE'])
+    @requires_auth(permission=AnyOf('delete:favorites', 'patch:customers'))
+    def remove_favorite(customer_id, item_id):
+        if not remove_customer_item(
+                favorite_items_table, customer_id, item_id):
+            abort(404)
+        return jsonify({
+            'success': True,
+            'customer_id': customer_id,
+            'item_id': item_id
+        })
+
+    @app.route('/customers/<int:customer_id>/purchases', methods=['GET'])
+    @requires_auth(permission=AnyOf('get:purchases', 'get:customers'))
+    @conditional_get('purchased', 'items')
+    def get_purchases(customer_id):
+        return customer_items_response(
+            purchased_items_table, 'purchases', customer_id)
+
+    @app.route('/customers/<int:customer_id>/purchases', methods=['POST'])
+    @requires_auth(permission=AnyOf('create:purchases', 'patch:customers'))
+    def add_purchases(customer_id):
+        added = add_customer_items(
+            purchased_items_table, customer_id, item_ids_arg())
+        return jsonify({
+            'success': True,
+            'customer_id': customer_id,
+            'added': added
+        })
+
+    @app.route('/customers/<int:customer_id>/purchases/<int:item_id>',
+               methods=['DELETE'])
+    @requires_auth(permission=AnyOf('delete:purchases', 'patch:customers'))
+    def remove_purchase(customer_id, item_id):
+        if not remove_customer_item(
+                purchased_items_table, customer_id, item_id):
+            abort(404)
+        return jsonify({
+            'success': True,
+            'customer_id': customer_id,
+            'item_id': item_id
         })
 
 # Error handlers
@@ -200,6 +695,15 @@ def create_app(config=Config):
             'message': e.description
         }), 400
 
+    @app.errorhandler(403)
+    def forbidden(e):
+        return jsonify({
+            'success': False,
+            'status': e.code,
+            'error': e.name,
+            'message': e.description
+        }), 403
+
     @app.errorhandler(404)
     def not_found(e):
         return jsonify({
@@ -227,6 +731,7 @@ def create_app(config=Config):
             'message': e.description
         }), 500
 
+    request_units_of_work(app)
     return app
 
 
@@ -0,0 +1,232 @@
+"""
+ASGI entry point: SideBoard on an event loop.
+
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+
+Needs the packages in requirements-async.txt. The WSGI app (app:app,
+run with gunicorn.conf.py) stays the default deployment.
+"""
+import time
+
+from a2wsgi import WSGIMiddleware
+from flask import g, request
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from app import create_app, CollectionListing, LISTING_TABLES
+from auth import AuthError, check_permissions, get_token_auth_header
+from auth import verify_token_async
+from cache import get_cache, hit_response, store_response
+from config import async_database_uri, async_engine_options
+from etags import not_modified, versions_etag, with_etag
+from models import Merchant, Item, Customer
+from models import table_versions_query, versions_from_rows
+from timing import RequestTimer
+
+'''
+Async listings
+    GET /merchants, /items and /customers, the endpoints clients poll,
+    run as coroutines: verifying a token that isn't cached is awaited in
+    a thread, and the table versions and listing queries are awaited on
+    an async engine, so one worker keeps serving other requests while
+    these wait. Every other request, and streamed listings, go to the
+    WSGI app in a thread pool.
+
+    The coroutines reuse the WSGI app's argument parsing, response
+    cache, ETags and error handlers. Flask's request context belongs to
+    a thread, not to a coroutine, so it is only pushed for the
+    synchronous steps between two awaits, never held across one.
+
+    The request is timed like the WSGI app's (see timing.py). The
+    awaited token verification and queries run outside of a request
+    context, so they are added to the timer explicitly.
+'''
+
+ASYNC_LISTINGS = {
+    '/merchants': (Merchant, 'merchants', 'get:merchants'),
+    '/items': (Item, 'items', 'get:items'),
+    '/customers': (Customer, 'customers', 'get:customers'),
+}
+
+# Threads running the WSGI app for the other endpoints
+WSGI_THREADS = 10
+
+
+class Finished(Exception):
+    '''Raised by a step with the response that ends the request'''
+
+    def __init__(self, response):
+        self.response = response
+
+
+class Delegate(Exception):
+    '''Raised by a step to hand the request over to the WSGI app'''
+
+
+def build_environ(scope):
+    headers = [(name.decode('latin-1'), value.decode('latin-1'))
+               for name, value in scope['headers']]
+    builder = EnvironBuilder(
+        path=scope.get('root_path', '') + scope['path'],
+        query_string=scope['query_string'].decode('latin-1'),
+        method=scope['method'], headers=headers)
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+async def send_response(send, response):
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+               for name, value in response.headers.items()]
+    await send({'type': 'http.response.start',
+                'status': response.status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+class AsyncApp(object):
+    def __init__(self, flask_app, engine, wsgi_threads=WSGI_THREADS):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        listing = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            listing = ASYNC_LISTINGS.get(scope['path'])
+        if listing is not None:
+            try:
+                response = await self.list(scope, *listing)
+            except Delegate:
+                pass
+            else:
+                return await send_response(send, response)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def step(self, environ, f, *args):
+        '''
+        Runs f in a request context. Errors become the responses of the
+        app's error handlers, raised as Finished
+        '''
+        with self.flask_app.request_context(environ):
+            # Kept in the environ: each step has a new request context
+            g.request_timer = environ.get('sideboard.request_timer')
+            try:
+                return f(*args)
+            except (HTTPException, AuthError, SQLAlchemyError) as e:
+                raise Finished(self.error_response(e))
+
+    async def list(self, scope, model, name, permission):
+        '''The same as the WSGI app's GET listing, awaiting I/O'''
+        environ = build_environ(scope)
+        timer = environ['sideboard.request_timer'] = RequestTimer()
+        tables = LISTING_TABLES[name]
+        try:
+            token = self.step(environ, get_token_auth_header)
+            start = time.perf_counter()
+            try:
+                payload, granted = await verify_token_async(token)
+            except AuthError as e:
+                raise Finished(self.step(environ, self.error_response, e))
+            finally:
+                timer.add('auth', time.perf_counter() - start)
+            listing = self.step(environ, self.prepare, model, name,
+                                permission, payload, granted)
+
+            async with AsyncSession(self.engine) as session:
+                try:
+                    result = await self.execute(
+                        session, timer, table_versions_query(tables))
+                    versions = versions_from_rows(tables, result)
+                    key = self.step(environ, self.check_cache, payload,
+                                    granted, tables, versions)
+                    etag = self.step(environ, versions_etag, tables,
+                                     versions)
+                    self.step(environ, self.check_etag, etag, key)
+                    result = await self.execute(
+                        session, timer, listing.statement())
+                    rows = result.scalars().all() if listing.entities \
+                        else result.all()
+                except SQLAlchemyError as e:
+                    raise Finished(
+                        self.step(environ, self.error_response, e))
+
+            return self.step(environ, self.respond, listing, rows, etag, key)
+        except Finished as finished:
+            return finished.response
+
+    async def execute(self, session, timer, statement):
+        start = time.perf_counter()
+        try:
+            return await session.execute(statement)
+        finally:
+            timer.queries += 1
+            timer.add('db', time.perf_counter() - start)
+
+    def prepare(self, model, name, permission, payload, granted):
+        '''Checks the caller's permission, builds the listing'''
+        check_permissions(permission, payload, granted)
+        if 'stream' in request.args:
+            raise Delegate()
+        return CollectionListing(model, name, entities=select(model))
+
+    def check_cache(self, payload, granted, tables, versions):
+        '''The response cache key, finishing the request on a hit'''
+        g.jwt_payload = payload
+        g.permissions = granted
+        cache = get_cache()
+        if cache is None:
+            return None
+        key = cache.key(tables, versions)
+        cached = cache.get(key)
+        if cached is not None:
+            raise Finished(self.finish(hit_response(cached)))
+        return key
+
+    def check_etag(self, etag, key):
+        response = not_modified(etag)
+        if response is not None:
+            raise Finished(self.finish(self.store(response, key)))
+
+    def respond(self, listing, rows, etag, key):
+        response = with_etag(listing.response(rows), etag)
+        return self.finish(self.store(response, key))
+
+    def store(self, response, key):
+        if key is None:
+            return response
+        return store_response(get_cache(), key, response)
+
+    def error_response(self, e):
+        return self.finish(self.flask_app.handle_user_exception(e))
+
+    def finish(self, response):
+        '''Runs the app's after_request functions (CORS headers)'''
+        return self.flask_app.process_response(
+            self.flask_app.make_response(response))
+
+
+def create_asgi_app(config=None):
+    flask_app = create_app(config)
+    uri = flask_app.config['SQLALCHEMY_DATABASE_URI']
+    engine = create_async_engine(async_database_uri(uri),
+                                 **async_engine_options(uri))
+    return AsyncApp(flask_app, engine)
+
+
+app = create_asgi_app()
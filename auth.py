@@ -1,8 +1,14 @@
+import asyncio
+import hashlib
 import json
 import os
-from flask import request
+import threading
+import time
+from collections import OrderedDict
+from flask import g, request
 from functools import wraps
-from jose import jwt
+from jose import jwk, jwt
+from timing import timed
 from urllib.request import urlopen
 
 
@@ -10,6 +16,15 @@ AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN')
 ALGORITHMS = os.getenv('ALGORITHMS')
 API_AUDIENCE = os.getenv('API_AUDIENCE')
 
+# How long (seconds) fetched signing keys are trusted before a refetch
+JWKS_TTL = float(os.getenv('JWKS_TTL', 600))
+# Minimum gap (seconds) between refetches triggered by an unknown kid
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv('JWKS_MIN_REFRESH_INTERVAL', 30))
+# Local JWKS file to use instead of the Auth0 tenant (local runs, load tests)
+JWKS_FILE = os.getenv('JWKS_FILE')
+# Number of verified tokens kept in memory (0 disables the cache)
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+
 # AuthError Exception
 '''
 AuthError Exception
@@ -60,8 +75,33 @@ def get_token_auth_header():
     return token
 
 
-def check_permissions(permission, payload):
+'''
+Compound permission requirements
+    requires_auth accepts a single permission string, or AnyOf / AllOf
+    built from permission strings and other requirements, e.g.
+    AnyOf('patch:items', AllOf('create:items', 'delete:items'))
+'''
+
+
+class AnyOf(object):
+    def __init__(self, *requirements):
+        self.permissions = frozenset(
+            r for r in requirements if isinstance(r, str))
+        self.nested = tuple(
+            r for r in requirements if not isinstance(r, str))
+
+    def satisfied_by(self, granted):
+        return not self.permissions.isdisjoint(granted) or \
+            any(r.satisfied_by(granted) for r in self.nested)
+
+
+class AllOf(AnyOf):
+    def satisfied_by(self, granted):
+        return self.permissions <= granted and \
+            all(r.satisfied_by(granted) for r in self.nested)
+
 
+def compile_permissions(payload):
     if 'permissions' not in payload:
         raise AuthError({
             'code': 'invalid_payload',
@@ -69,7 +109,19 @@ def check_permissions(permission, payload):
             'Incorrect payload. Payload must contain permissions field.'
         }, 400)
 
-    if permission not in payload['permissions']:
+    return frozenset(payload['permissions'])
+
+
+def check_permissions(permission, payload, granted=None):
+    if granted is None:
+        granted = compile_permissions(payload)
+
+    if isinstance(permission, str):
+        allowed = permission in granted
+    else:
+        allowed = permission.satisfied_by(granted)
+
+    if not allowed:
         raise AuthError({
             'code': 'invalid_permissions',
             'description':
@@ -79,26 +131,128 @@ def check_permissions(permission, payload):
     return True
 
 
-def verify_decode_jwt(token):
+'''
+JWKS fetchers
+    callables returning the parsed JWKS document. The default one
+    hits the Auth0 tenant, file_jwks_fetcher reads a local file
+    (handy for tests and benchmarks)
+'''
+
+
+def fetch_jwks():
     jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
+    return json.loads(jsonurl.read())
+
+
+def file_jwks_fetcher(path):
+    def fetch():
+        with open(path) as f:
+            return json.load(f)
+    return fetch
+
+
+'''
+JWKSKeyStore
+    In-process cache of the signing keys, parsed once into key objects.
+    Keys are refetched when the TTL runs out, or when a token shows up
+    with an unknown kid (at most once per min_refresh_interval).
+    Concurrent refreshes are collapsed into a single fetch.
+'''
+
+
+class JWKSKeyStore(object):
+    def __init__(self, fetcher=fetch_jwks, ttl=JWKS_TTL,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 clock=time.monotonic):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.clock = clock
+        self.fetch_count = 0
+        self._keys = {}
+        self._fetched_at = None
+        self._attempted_at = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_key(self, kid):
+        generation = self._generation
+        if self._fetched_at is None:
+            self.refresh(generation)
+        elif self._expired() or kid not in self._keys:
+            if self._may_refetch():
+                self.refresh(generation)
+        return self._keys.get(kid)
+
+    def refresh(self, seen_generation=None):
+        with self._lock:
+            # Another thread refreshed while we waited for the lock
+            if seen_generation is not None and \
+                    seen_generation != self._generation:
+                return
+            self._attempted_at = self.clock()
+            try:
+                jwks = self.fetcher()
+            except Exception:
+                self._generation += 1
+                # Keep serving the keys we have, if any
+                if self._keys:
+                    return
+                raise
+            self.fetch_count += 1
+            self._keys = self.parse_keys(jwks)
+            self._fetched_at = self.clock()
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._attempted_at = None
+            self._generation += 1
+
+    def _expired(self):
+        return self.clock() - self._fetched_at >= self.ttl
+
+    def _may_refetch(self):
+        attempted_at = self._attempted_at
+        return attempted_at is None or \
+            self.clock() - attempted_at >= self.min_refresh_interval
+
+    @staticmethod
+    def parse_keys(jwks):
+        keys = {}
+        for key in jwks.get('keys', []):
+            if key.get('kty') != 'RSA' or 'kid' not in key:
+                continue
+            try:
+                keys[key['kid']] = jwk.construct(
+                    key, key.get('alg') or ALGORITHMS or 'RS256')
+            except Exception:
+                # Skip keys we can't use rather than failing the whole set
+                continue
+        return keys
+
+
+jwks_store = JWKSKeyStore(
+    fetcher=file_jwks_fetcher(JWKS_FILE) if JWKS_FILE else fetch_jwks)
+
+
+def verify_decode_jwt(token):
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except jwt.JWTError:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization malformed.'
+        }, 401)
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks_store.get_key(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -133,13 +287,111 @@ def verify_decode_jwt(token):
         }, 400)
 
 
+'''
+TokenCache
+    Bounded LRU of already verified tokens, keyed by a digest of the
+    raw token. Entries expire at the token's exp claim, so a cached
+    token is never accepted for longer than jwt.decode would accept it.
+'''
+
+
+class TokenCache(object):
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if self.clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token, value, expires_at):
+        if self.maxsize <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize
+        }
+
+
+token_cache = TokenCache()
+
+
+def get_verified_token(token):
+    '''Returns the verified payload and its compiled permission set'''
+    verified = token_cache.get(token)
+    if verified is None:
+        verified = verify_and_cache_token(token)
+    return verified
+
+
+def verify_and_cache_token(token):
+    with timed('auth'):
+        payload = verify_decode_jwt(token)
+    verified = (payload, compile_permissions(payload))
+    token_cache.put(token, verified, payload.get('exp'))
+    return verified
+
+
+'''
+verify_token_async(token)
+    get_verified_token for ASGI mode (see asgi.py). A cached token is
+    answered right away; otherwise the JWKS fetch and the signature
+    check run in the default executor, so the event loop keeps serving
+    other requests meanwhile.
+'''
+
+
+async def verify_token_async(token):
+    verified = token_cache.get(token)
+    if verified is not None:
+        return verified
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, verify_and_cache_token, token)
+
+
 def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            payload, granted = get_verified_token(token)
+            check_permissions(permission, payload, granted)
+            g.jwt_payload = payload
+            g.permissions = granted
             return f(*args, **kwargs)
 
         return wrapper
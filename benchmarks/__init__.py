@@ -0,0 +1,5 @@
+"""
+Benchmarks for the SideBoard API.
+Run each one from the repository root, e.g.
+    python -m benchmarks.auth_bench
+"""
@@ -0,0 +1,112 @@
+"""
+Concurrent throughput of one worker in sync (WSGI) and async (ASGI) mode.
+
+    python -m benchmarks.async_bench --concurrency 64 \
+        --database-url postgresql://localhost/sideboard_bench
+
+Starts a single gunicorn gthread worker (app:app) and a single uvicorn
+worker (asgi:app) in turn, with the response cache off so every request
+reaches the database, and drives the same GET requests at both from
+concurrent keep-alive clients.
+
+The async mode pays off when requests wait on the network: run it
+against Postgres, ideally on another host. With the default throwaway
+SQLite file every query is local and the numbers mostly compare CPU
+overheads.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.gunicorn_bench import ROOT, drive, free_port
+from benchmarks.gunicorn_bench import percentile, wait_for_port
+from benchmarks.stream_bench import populate
+from benchmarks.tokens import LocalKey
+
+MODES = {
+    'sync: gunicorn gthread': lambda port, args: [
+        sys.executable, '-m', 'gunicorn', '-c',
+        os.path.join(ROOT, 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{port}', 'app:app'],
+    'async: uvicorn': lambda port, args: [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+        '--no-access-log'],
+}
+
+
+def run_mode(name, env, args, headers):
+    port = free_port()
+    proc = subprocess.Popen(
+        MODES[name](port, args), cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        drive(port, args.path, headers, args.concurrency, 1)
+        latencies, errors = drive(port, args.path, headers,
+                                  args.concurrency, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        'mode': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--path', default='/items?limit=50')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=4,
+                        help='threads of the sync worker')
+    parser.add_argument('--database-url',
+                        help='a populated database (default: a new '
+                             'SQLite file)')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the server logs')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url
+        if url is None:
+            db_path = os.path.join(tmp, 'bench.db')
+            populate(db_path, args.items)
+            url = f'sqlite:///{db_path}'
+        key = LocalKey(bits=1024)
+        jwks_path = os.path.join(tmp, 'jwks.json')
+        with open(jwks_path, 'w') as f:
+            json.dump(key.jwks(), f)
+        headers = {'Authorization': f'Bearer {key.token(["get:items"])}'}
+        env = dict(os.environ,
+                   DATABASE_URL=url,
+                   JWKS_FILE=jwks_path,
+                   RESPONSE_CACHE_BACKEND='none',
+                   WEB_CONCURRENCY='1',
+                   GUNICORN_THREADS=str(args.threads))
+
+        results = []
+        for name in MODES:
+            result = run_mode(name, env, args, headers)
+            results.append(result)
+            if not args.json:
+                print('{mode:24} {rps:9} req/s  p50 {p50_ms:7} ms  '
+                      'p95 {p95_ms:7} ms  p99 {p99_ms:7} ms  '
+                      'errors {errors}'.format(**result))
+        if args.json:
+            print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
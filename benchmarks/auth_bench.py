@@ -0,0 +1,62 @@
+"""
+Per-request auth CPU with and without the verified-token cache.
+
+    python -m benchmarks.auth_bench --requests 2000
+
+Tokens are minted with a locally generated RS256 key, so no network
+access is needed.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('AUTH0_DOMAIN', 'jmw-dev.us.auth0.com')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'sideboard')
+
+from flask import Flask  # noqa: E402
+
+import auth  # noqa: E402
+from benchmarks.tokens import LocalKey, use_local_key  # noqa: E402
+
+
+def run(app, token, requests):
+    @auth.requires_auth(permission='get:items')
+    def endpoint():
+        return None
+
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.test_request_context('/items', headers=headers):
+        start = time.process_time()
+        for _ in range(requests):
+            endpoint()
+        return (time.process_time() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    key = LocalKey()
+    use_local_key(key)
+    token = key.token(permissions=['get:items'])
+
+    cache_size = auth.token_cache.maxsize
+    auth.token_cache.maxsize = 0
+    uncached = run(app, token, args.requests)
+
+    auth.token_cache.maxsize = cache_size
+    auth.token_cache.clear()
+    cached = run(app, token, args.requests)
+
+    print(f'requests:         {args.requests}')
+    print(f'no token cache:   {uncached * 1e6:10.1f} us CPU / request')
+    print(f'with token cache: {cached * 1e6:10.1f} us CPU / request')
+    print(f'speedup:          {uncached / cached:10.1f}x')
+    print(f'cache stats:      {auth.token_cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Catalog price updates: PATCH /items/bulk against one PATCH per item.
+
+    python -m benchmarks.bulk_update_bench --items 50000
+
+Creates a merchant with --items items, then changes every price with
+one PATCH /items/bulk request, and a sample of --single prices with
+PATCH /items/<id>, through the Flask test client with a locally
+minted merchant token. Reports per mode the rows, statements and
+seconds, and the rows updated per second, as JSON lines.
+
+A throwaway SQLite file is used unless --database-url is given.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('AUTH0_DOMAIN', 'jmw-dev.us.auth0.com')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'sideboard')
+
+from sqlalchemy import event  # noqa: E402
+
+from benchmarks.synthetic import make_config  # noqa: E402
+from benchmarks.tokens import LocalKey, use_local_key  # noqa: E402
+
+
+def populate(app, items):
+    from models import db, Merchant, Item, bulk_insert
+
+    with app.app_context():
+        db.create_all()
+        merchant = Merchant(name='Bench Merchant')
+        merchant.insert()
+        merchant_id = merchant.id
+        ids = bulk_insert(Item, [
+            {'name': f'item {i}', 'price': 10.0, 'merchant_id': merchant_id}
+            for i in range(items)])
+    return merchant_id, ids
+
+
+def measure(app, mode, requests, merchant_id):
+    '''Runs (path, body) PATCH requests as the merchant'''
+    from models import db
+
+    key = LocalKey(bits=1024)
+    use_local_key(key)
+    token = key.token(['patch:items'],
+                      **{app.config['MERCHANT_ID_CLAIM']: merchant_id})
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+    counts = {'statements': 0}
+
+    def count_statement(*args):
+        counts['statements'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    rows = 0
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        start = time.perf_counter()
+        for path, body in requests:
+            res = client.patch(path, json=body, headers=headers)
+            if res.status_code != 200:
+                raise RuntimeError(f'{path}: {res.status_code} '
+                                   f'{res.get_data(as_text=True)[:200]}')
+            rows += len(body) if isinstance(body, list) else 1
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    return {
+        'mode': mode,
+        'rows': rows,
+        'statements': counts['statements'],
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--single', type=int, default=500,
+                        help='items updated one request each')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url',
+                        help='an empty or throwaway database')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or \
+            f'sqlite:///{os.path.join(tmp, "bulk_update_bench.db")}'
+        app = create_app(make_config(url))
+        app.config['BULK_UPDATE_MAX_ROWS'] = max(
+            app.config['BULK_UPDATE_MAX_ROWS'], args.items)
+        merchant_id, ids = populate(app, args.items)
+
+        body = [{'id': item_id, 'price': round(rng.uniform(5, 500), 2)}
+                for item_id in ids]
+        print(json.dumps(measure(app, 'bulk', [('/items/bulk', body)],
+                                 merchant_id)))
+        print(json.dumps(measure(app, 'single', [
+            (f'/items/{item_id}?fields=price',
+             {'price': round(rng.uniform(5, 500), 2)})
+            for item_id in rng.sample(ids, min(args.single, len(ids)))],
+            merchant_id)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+EXPLAIN ANALYZE of the hot lookup queries, with and without the indexes
+added in migration 3f9c1d2e7b64.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.explain_bench
+
+Needs a populated Postgres database at the 3f9c1d2e7b64 revision. The
+"before" plans are taken inside a transaction that drops the indexes
+and is rolled back, so the database is left untouched (the DROP INDEX
+does lock the tables until the rollback: don't run this in production).
+"""
+import argparse
+import json
+import os
+
+from sqlalchemy import create_engine, text
+
+INDEXES = (
+    'ix_items_merchant_id',
+    'ix_favorites_item_id_customer_id',
+    'ix_purchased_item_id_customer_id',
+    'ix_customers_email',
+    'ix_items_name_trgm',
+    'ix_merchants_name_trgm',
+    'ix_items_name_prefix',
+    'ix_merchants_name_prefix',
+)
+
+QUERIES = {
+    'items_by_merchant':
+        'SELECT id, name, price FROM items WHERE merchant_id = :merchant_id',
+    'favorited_by':
+        'SELECT customer_id FROM favorites WHERE item_id = :item_id',
+    'purchased_by':
+        'SELECT customer_id FROM purchased WHERE item_id = :item_id',
+    'customer_by_email':
+        'SELECT id, name FROM customers WHERE email = :email',
+    'items_name_contains':
+        'SELECT id, name FROM items WHERE name ILIKE :contains',
+    'items_name_prefix':
+        'SELECT id, name FROM items WHERE name LIKE :prefix',
+    'merchants_name_contains':
+        'SELECT id, name FROM merchants WHERE name ILIKE :contains',
+}
+
+
+def sample_params(conn):
+    '''Picks real values from the data so the lookups hit rows'''
+    merchant_id, = conn.execute(text(
+        'SELECT merchant_id FROM items ORDER BY id DESC LIMIT 1')).one()
+    item_id, name = conn.execute(text(
+        'SELECT id, name FROM items ORDER BY id DESC LIMIT 1')).one()
+    email = conn.execute(text(
+        'SELECT email FROM customers ORDER BY id DESC LIMIT 1')).scalar()
+    word = name.split()[0][:8]
+    return {
+        'merchant_id': merchant_id,
+        'item_id': item_id,
+        'email': email,
+        'contains': f'%{word[1:]}%',
+        'prefix': f'{word}%'
+    }
+
+
+def explain(conn, sql, params):
+    plan = conn.execute(text(
+        'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+    nodes = []
+
+    def walk(node):
+        nodes.append(node['Node Type'])
+        for child in node.get('Plans', []):
+            walk(child)
+    walk(plan['Plan'])
+    return {
+        'execution_ms': plan['Execution Time'],
+        'nodes': nodes,
+        'seq_scan': 'Seq Scan' in nodes
+    }
+
+
+def run_all(conn, params):
+    return {name: explain(conn, sql, params)
+            for name, sql in QUERIES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default=os.getenv('DATABASE_URL'))
+    args = parser.parse_args()
+    url = (args.url or '').replace('postgres://', 'postgresql://', 1)
+    if not url.startswith('postgresql'):
+        parser.error('a Postgres DATABASE_URL (or --url) is required')
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        params = sample_params(conn)
+        with conn.begin() as trans:
+            for index in INDEXES:
+                conn.execute(text(f'DROP INDEX IF EXISTS {index}'))
+            before = run_all(conn, params)
+            trans.rollback()
+        after = run_all(conn, params)
+
+    report = {name: {'before': before[name], 'after': after[name]}
+              for name in QUERIES}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
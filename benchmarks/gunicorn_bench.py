@@ -0,0 +1,192 @@
+"""
+Load test comparing gunicorn configurations.
+
+    python -m benchmarks.gunicorn_bench --items 20000 --concurrency 32
+
+Serves the app from a throwaway SQLite file with a local JWKS file,
+starts gunicorn once per configuration and drives GET requests at it
+from concurrent keep-alive clients. Reports throughput and latency
+percentiles per configuration (and as JSON with --json).
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.stream_bench import populate
+from benchmarks.tokens import LocalKey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    # What `gunicorn app:app` did before gunicorn.conf.py existed
+    'baseline: 1 sync worker': {
+        'conf': None, 'WEB_CONCURRENCY': '1'},
+    'sync workers': {
+        'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread workers': {
+        'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '4'},
+    'gevent workers': {
+        'GUNICORN_WORKER_CLASS': 'gevent'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'gunicorn did not start on port {port}')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def drive(port, path, headers, concurrency, duration, method='GET',
+          body=None):
+    '''
+    Keep-alive clients hammering `path` (or cycling through a list of
+    paths); returns latencies and errors
+    '''
+    paths = [path] if isinstance(path, str) else list(path)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        failed = 0
+        for i in itertools.count(offset):
+            if time.perf_counter() >= stop_at:
+                break
+            start = time.perf_counter()
+            try:
+                conn.request(method, paths[i % len(paths)], body=body,
+                             headers=headers)
+                res = conn.getresponse()
+                res.read()
+                if res.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port,
+                                                  timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run_config(name, overrides, env, args, headers):
+    overrides = dict(overrides)
+    conf = overrides.pop('conf', os.path.join(ROOT, 'gunicorn.conf.py'))
+    if conf is None:
+        conf = os.path.join(env['BENCH_TMP'], 'empty.conf.py')
+        open(conf, 'w').close()
+    port = free_port()
+    env = dict(env, PORT=str(port), **overrides)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', conf,
+         '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        # Warm up: JWKS, token cache and connection pools
+        drive(port, args.path, headers, args.concurrency, 1)
+        latencies, errors = drive(port, args.path, headers,
+                                  args.concurrency, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        'config': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--path', default='/items?limit=50')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the gunicorn logs')
+    args = parser.parse_args()
+
+    configs = dict(CONFIGS)
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        del configs['gevent workers']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        populate(db_path, args.items)
+        key = LocalKey(bits=1024)
+        jwks_path = os.path.join(tmp, 'jwks.json')
+        with open(jwks_path, 'w') as f:
+            json.dump(key.jwks(), f)
+        headers = {'Authorization': f'Bearer {key.token(["get:items"])}'}
+        env = dict(os.environ,
+                   BENCH_TMP=tmp,
+                   DATABASE_URL=f'sqlite:///{db_path}',
+                   JWKS_FILE=jwks_path,
+                   WEB_CONCURRENCY=str(args.workers))
+
+        results = []
+        for name, overrides in configs.items():
+            result = run_config(name, overrides, env, args, headers)
+            results.append(result)
+            if not args.json:
+                print('{config:26} {rps:9} req/s  p50 {p50_ms:7} ms  '
+                      'p95 {p95_ms:7} ms  p99 {p99_ms:7} ms  '
+                      'errors {errors}'.format(**result))
+        if args.json:
+            print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""
+Throughput and latency of every endpoint on synthetic data.
+
+    python -m benchmarks.load_bench --items 200000 --customers 50000 \
+        --output before.json
+    python -m benchmarks.load_bench --items 200000 --customers 50000 \
+        --output after.json
+    python -m benchmarks.load_bench --compare before.json after.json
+
+Fills a database with benchmarks.synthetic (a temporary SQLite file by
+default, --database-url, or a throwaway Postgres with --postgres), then
+runs each scenario below with two drivers:
+    client  sequential requests through the Flask test client, in
+            process: the cost of the code itself
+    http    concurrent keep-alive clients against gunicorn run with
+            gunicorn.conf.py: throughput under load
+Tokens are minted with a local key (a JWKS file for gunicorn), so
+neither Auth0 nor the network is involved.
+
+The report is JSON: the settings, the data and the git revision, then
+per scenario and driver the request count, errors, requests per second
+and latency percentiles. --compare prints the differences between two
+reports. The response cache is off unless --cache is given, so requests
+measure the queries rather than cache hits.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+from benchmarks.gunicorn_bench import ROOT, drive, free_port
+from benchmarks.gunicorn_bench import percentile, wait_for_port
+from benchmarks.search_bench import NOUNS
+from benchmarks.tokens import LocalKey, use_local_key
+
+PERMISSIONS = [f'{action}:{collection}'
+               for action in ('get', 'create', 'patch', 'delete')
+               for collection in ('merchants', 'items', 'customers')]
+
+# name: (method, path, JSON body). {merchant}, {item}, {customer} and
+# {word} are filled with ids and search words drawn with the seed
+SCENARIOS = {
+    'list_merchants': ('GET', '/merchants?limit=100', None),
+    'list_items': ('GET', '/items?limit=100', None),
+    'list_items_by_price': (
+        'GET', '/items?sort=price&price_min=20&price_max=80&limit=100',
+        None),
+    'list_merchant_items': ('GET', '/items?merchant_id={merchant}', None),
+    'list_customers': ('GET', '/customers?limit=100', None),
+    'get_merchant': ('GET', '/merchants/{merchant}', None),
+    'get_item': ('GET', '/items/{item}', None),
+    'get_customer': ('GET', '/customers/{customer}', None),
+    'customer_favorites': ('GET', '/customers/{customer}/favorites', None),
+    'customer_purchases': ('GET', '/customers/{customer}/purchases', None),
+    'search_items': ('GET', '/items/search?q={word}&limit=20', None),
+    'export_merchant_items': (
+        'GET', '/items?stream=ndjson&merchant_id={merchant}', None),
+    # Writes last: they invalidate what the reads depend on
+    'patch_item': ('PATCH', '/items/{item}', {'price': 42.0}),
+}
+
+# Distinct paths per scenario, cycled through by the drivers
+PATHS = 200
+
+
+def scenario_paths(template, ids, rng):
+    return [template.format(merchant=rng.choice(ids['merchants']),
+                            item=rng.choice(ids['items']),
+                            customer=rng.choice(ids['customers']),
+                            word=rng.choice(NOUNS))
+            for _ in range(PATHS)]
+
+
+def load_ids(app):
+    from models import db, Merchant, Item, Customer
+
+    with app.app_context():
+        return {name: [id for id, in db.session.query(model.id)]
+                for name, model in (('merchants', Merchant),
+                                    ('items', Item),
+                                    ('customers', Customer))}
+
+
+def make_config(url, cache):
+    base = synthetic.make_config(url)
+
+    class LoadConfig(base):
+        RESPONSE_CACHE_BACKEND = cache
+    return LoadConfig
+
+
+def summarize(scenario, driver, latencies, errors, elapsed):
+    if not latencies:
+        return {'scenario': scenario, 'driver': driver, 'requests': 0,
+                'errors': errors}
+    return {
+        'scenario': scenario,
+        'driver': driver,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def run_client(app, scenarios, headers, args):
+    client = app.test_client()
+    for name, (method, paths, body) in scenarios.items():
+        latencies = []
+        errors = 0
+        for i in range(args.warmup + args.requests):
+            start = time.perf_counter()
+            res = client.open(paths[i % len(paths)], method=method,
+                              json=body, headers=headers)
+            res.get_data()
+            elapsed = time.perf_counter() - start
+            if i < args.warmup:
+                continue
+            if res.status_code != 200:
+                errors += 1
+            latencies.append(elapsed)
+        yield summarize(name, 'client', latencies, errors, sum(latencies))
+
+
+def run_http(url, scenarios, key, args, tmp):
+    jwks_path = os.path.join(tmp, 'jwks.json')
+    with open(jwks_path, 'w') as f:
+        json.dump(key.jwks(), f)
+    headers = {'Authorization': f'Bearer {key.token(PERMISSIONS)}'}
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL=url,
+               JWKS_FILE=jwks_path,
+               RESPONSE_CACHE_BACKEND=args.cache,
+               WEB_CONCURRENCY=str(args.workers))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c',
+         os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        for name, (method, paths, body) in scenarios.items():
+            request_headers = headers
+            if body is not None:
+                body = json.dumps(body)
+                request_headers = dict(headers,
+                                       **{'Content-Type': 'application/json'})
+            # Warm up: JWKS, token cache and connection pools
+            drive(port, paths, request_headers, args.concurrency, 1,
+                  method, body)
+            latencies, errors = drive(port, paths, request_headers,
+                                      args.concurrency, args.duration,
+                                      method, body)
+            yield summarize(name, 'http', latencies, errors, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+            capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def progress(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def run(args):
+    from app import create_app
+
+    names = args.scenarios.split(',') if args.scenarios else SCENARIOS
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        sys.exit('Unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+    drivers = args.drivers.split(',')
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            synthetic.database(args.database_url, args.sqlite,
+                               args.postgres) as url:
+        app = create_app(make_config(url, args.cache))
+        if not args.skip_populate:
+            progress('populating...')
+            counts = synthetic.generate(app, args.merchants, args.items,
+                                        args.customers, args.seed)
+        else:
+            counts = None
+        ids = load_ids(app)
+        rng = random.Random(args.seed)
+        scenarios = {name: (SCENARIOS[name][0],
+                            scenario_paths(SCENARIOS[name][1], ids, rng),
+                            SCENARIOS[name][2])
+                     for name in names}
+
+        key = LocalKey(bits=1024)
+        results = []
+        if 'client' in drivers:
+            use_local_key(key)
+            headers = {'Authorization': f'Bearer {key.token(PERMISSIONS)}'}
+            for result in run_client(app, scenarios, headers, args):
+                progress(format_result(result))
+                results.append(result)
+        if 'http' in drivers:
+            for result in run_http(url, scenarios, key, args, tmp):
+                progress(format_result(result))
+                results.append(result)
+
+        return {
+            'meta': {
+                'started': datetime.datetime.utcnow().isoformat() + 'Z',
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'database': url.split(':', 1)[0],
+                'seed': args.seed,
+                'data': counts,
+                'cache': args.cache,
+                'client': {'requests': args.requests,
+                           'warmup': args.warmup},
+                'http': {'workers': args.workers,
+                         'concurrency': args.concurrency,
+                         'duration': args.duration},
+            },
+            'results': results,
+        }
+
+
+def format_result(result):
+    if not result['requests']:
+        return '{scenario:24} {driver:6} no requests, errors {errors}' \
+            .format(**result)
+    return ('{scenario:24} {driver:6} {rps:9} req/s  p50 {p50_ms:8} ms  '
+            'p99 {p99_ms:8} ms  errors {errors}'.format(**result))
+
+
+def change(before, after):
+    if before is None or after is None or not before:
+        return '      -'
+    return f'{(after - before) / before * 100:+6.1f}%'
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    baseline = {(r['scenario'], r['driver']): r for r in before['results']}
+    print('{:24} {:6} {:>10} {:>8} {:>10} {:>8} {:>10} {:>8}'.format(
+        'scenario', 'driver', 'req/s', '', 'p50 ms', '', 'p99 ms', ''))
+    for result in after['results']:
+        base = baseline.get((result['scenario'], result['driver']), {})
+        columns = []
+        for key in ('rps', 'p50_ms', 'p99_ms'):
+            columns += [result.get(key), change(base.get(key),
+                                                result.get(key))]
+        print('{:24} {:6} {:>10} {:>8} {:>10} {:>8} {:>10} {:>8}'.format(
+            result['scenario'], result['driver'],
+            *('-' if c is None else c for c in columns)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    synthetic.add_arguments(parser)
+    parser.add_argument('--skip-populate', action='store_true',
+                        help='reuse the data already in the database')
+    parser.add_argument('--scenarios',
+                        help='comma separated, all by default: {}'.format(
+                            ', '.join(SCENARIOS)))
+    parser.add_argument('--drivers', default='client,http')
+    parser.add_argument('--cache', default='none',
+                        help='RESPONSE_CACHE_BACKEND of the app')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per scenario (client)')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='gunicorn workers (http)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5,
+                        help='seconds per scenario (http)')
+    parser.add_argument('--output', help='write the report to a file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two reports instead of running')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the gunicorn logs')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Latency of GET /items/search on a synthetic catalog.
+
+    python -m benchmarks.search_bench --items 1000000 \
+        --database-url postgresql://localhost/sideboard_bench
+
+Fills the database (created from the models, so it must be empty or
+throwaway) with merchants and items whose names and descriptions are
+drawn from a small vocabulary, then times a mix of searches through the
+test client and reports latency percentiles per query as JSON lines.
+
+Without --database-url a temporary SQLite file is used, which searches
+through the in-process fallback index: fine to check the harness, but
+its numbers say nothing about Postgres (and 1M items need a lot of RAM).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('AUTH0_DOMAIN', 'jmw-dev.us.auth0.com')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'sideboard')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+ADJECTIVES = ('oak', 'walnut', 'vintage', 'rustic', 'brass', 'linen',
+              'velvet', 'modern', 'antique', 'painted', 'carved', 'woven')
+NOUNS = ('chair', 'table', 'lamp', 'sideboard', 'mirror', 'rug', 'desk',
+         'stool', 'cabinet', 'shelf', 'bench', 'dresser', 'vase', 'clock')
+STATES = ('Oregon', 'Texas', 'California', 'Maine', 'Ohio', 'Utah')
+
+QUERIES = {
+    'one_word': 'q=sideboard',
+    'two_words': 'q=rustic+table',
+    'rare_words': 'q=velvet+carved+clock',
+    'price_range': 'q=chair&price_min=50&price_max=150',
+    'state': 'q=lamp&state=Oregon',
+    'facets': 'q=oak&facets=state,merchant_id',
+    'second_page': 'q=desk&limit=50&after=50',
+}
+
+
+def make_config(url):
+    from config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        RESPONSE_CACHE_BACKEND = 'none'
+    return BenchConfig
+
+
+def populate(app, items, merchants, batch=20000, seed=0):
+    from models import db, Merchant, Item
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Merchant.__table__.insert(), [
+            {'name': f'Merchant {i}', 'city': f'City {i % 50}',
+             'state': STATES[i % len(STATES)]} for i in range(merchants)])
+        db.session.commit()
+        rows = []
+        for i in range(items):
+            words = rng.sample(ADJECTIVES, 2) + [rng.choice(NOUNS)]
+            rows.append({
+                'name': ' '.join(words[1:]),
+                'price': float(rng.randrange(5, 500)),
+                'description': f'A {words[0]} {words[2]} from the '
+                               f'{rng.choice(ADJECTIVES)} collection',
+                'merchant_id': rng.randrange(1, merchants + 1)
+            })
+            if len(rows) == batch:
+                db.session.execute(Item.__table__.insert(), rows)
+                db.session.commit()
+                rows = []
+        if rows:
+            db.session.execute(Item.__table__.insert(), rows)
+        db.session.commit()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE items'))
+            db.session.commit()
+
+
+def percentile(timings, p):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+def measure(app, repeat):
+    from benchmarks.tokens import LocalKey, use_local_key
+
+    key = LocalKey(bits=1024)
+    use_local_key(key)
+    headers = {'Authorization': f'Bearer {key.token(["get:items"])}'}
+    client = app.test_client()
+    for name, query in QUERIES.items():
+        url = f'/items/search?{query}'
+        res = client.get(url, headers=headers)  # warm up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            res = client.get(url, headers=headers)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(json.dumps({
+            'query': name,
+            'status': res.status_code,
+            'results': len(json.loads(res.data).get('items', [])),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'max_ms': round(max(timings), 2)
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--merchants', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--database-url')
+    parser.add_argument('--skip-populate', action='store_true',
+                        help='reuse the catalog already in the database')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or \
+            f'sqlite:///{os.path.join(tmp, "search_bench.db")}'
+        app = create_app(make_config(url))
+        if not args.skip_populate:
+            print(f'populating {args.items} items...', file=sys.stderr)
+            populate(app, args.items, args.merchants)
+        with app.app_context():
+            measure(app, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Listing serialization: ORM format() + jsonify vs Core rows + serializers.
+
+    python -m benchmarks.serializer_bench --rows 10000 100000
+
+Times building the GET /items response body from an in-memory SQLite
+table, for the old path (ORM instances, format(), Flask's jsonify) and
+the new one (Core select tuples, row_formatter, fast JSON backend).
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import jsonify  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from fieldsets import select_fieldset  # noqa: E402
+from models import db, Merchant, Item  # noqa: E402
+from serializers import BACKENDS, row_formatter  # noqa: E402
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def populate(rows):
+    db.session.execute(Item.__table__.delete())
+    db.session.execute(Item.__table__.insert(), [{
+        'name': f'item {i}',
+        'price': float(i % 500),
+        'image_link': f'https://example.com/{i}.png',
+        'merchant_id': 1
+    } for i in range(rows)])
+    db.session.commit()
+
+
+def orm_format_jsonify():
+    items = Item.query.all()
+    body = jsonify({
+        'success': True,
+        'items': [item.format() for item in items]
+    }).get_data()
+    db.session.expunge_all()
+    return body
+
+
+def core_rows(dumps):
+    def run():
+        fields = Item.DEFAULT_FIELDS
+        format_row = row_formatter(('id',) + fields)
+        rows = db.session.execute(select_fieldset(Item, fields)).all()
+        return dumps({
+            'success': True,
+            'items': [format_row(row) for row in rows]
+        })
+    return run
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.test_request_context():
+        db.create_all()
+        db.session.add(Merchant(name='Bench Merchant'))
+        db.session.commit()
+
+        paths = [('orm + format() + jsonify', orm_format_jsonify)]
+        for name, dumps in sorted(BACKENDS.items()):
+            paths.append((f'core rows + {name}', core_rows(dumps)))
+
+        for rows in args.rows:
+            populate(rows)
+            print(f'{rows} rows')
+            baseline = None
+            for label, fn in paths:
+                elapsed = best_of(fn, args.repeat)
+                baseline = baseline or elapsed
+                print(f'  {label:28} {elapsed * 1000:9.1f} ms'
+                      f'  {baseline / elapsed:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Peak worker memory when exporting GET /items, buffered vs streamed.
+
+    python -m benchmarks.stream_bench --items 1000000
+
+Fills a throwaway SQLite file with synthetic items, then runs each mode
+in a fresh interpreter and reports its peak RSS.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('AUTH0_DOMAIN', 'jmw-dev.us.auth0.com')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'sideboard')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+MODES = {
+    'buffered': '/items',
+    'ndjson': '/items?stream=ndjson',
+    'json': '/items?stream=json'
+}
+
+
+def make_config(path):
+    from config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    return BenchConfig
+
+
+def populate(path, items, batch=50000):
+    from app import create_app
+    from models import db, Merchant, Item
+
+    app = create_app(make_config(path))
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Merchant.__table__.insert(),
+                           [{'name': 'Bench Merchant'}])
+        rows = []
+        for i in range(items):
+            rows.append({
+                'name': f'item {i}',
+                'price': float(i % 500),
+                'description': 'A synthetic item for benchmarking',
+                'merchant_id': 1
+            })
+            if len(rows) == batch:
+                db.session.execute(Item.__table__.insert(), rows)
+                rows = []
+        if rows:
+            db.session.execute(Item.__table__.insert(), rows)
+        db.session.commit()
+
+
+def measure(path, mode):
+    from app import create_app
+    from benchmarks.tokens import LocalKey, use_local_key
+
+    app = create_app(make_config(path))
+    key = LocalKey(bits=1024)
+    use_local_key(key)
+    headers = {'Authorization': f'Bearer {key.token(["get:items"])}'}
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    res = app.test_client().get(MODES[mode], headers=headers,
+                                buffered=False)
+    size = 0
+    for chunk in res.response:
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'mode': mode,
+        'status': res.status_code,
+        'bytes': size,
+        'seconds': round(elapsed, 2),
+        'baseline_rss_mb': round(baseline / 1024, 1),
+        'peak_rss_mb': round(peak / 1024, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--measure', choices=MODES)
+    parser.add_argument('--db')
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.db, args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stream_bench.db')
+        print(f'populating {args.items} items...', file=sys.stderr)
+        populate(path, args.items)
+        for mode in MODES:
+            subprocess.run([sys.executable, '-m', 'benchmarks.stream_bench',
+                            '--measure', mode, '--db', path], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Synthetic SideBoard data at production scale.
+
+    python -m benchmarks.synthetic --merchants 1000 --items 200000 \
+        --customers 50000 --database-url postgresql://localhost/bench
+
+Creates the schema from the models (the database must be empty or
+throwaway) and fills it with merchants, items, customers and their
+favorites and purchases. The same --seed always produces the same
+rows, so two benchmark runs see the same data.
+
+--sqlite PATH fills a SQLite file instead. benchmarks.load_bench uses
+the same generator, and can also run it on a throwaway Postgres.
+"""
+import argparse
+import bisect
+import contextlib
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault('AUTH0_DOMAIN', 'jmw-dev.us.auth0.com')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'sideboard')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from benchmarks.gunicorn_bench import free_port  # noqa: E402
+from benchmarks.search_bench import ADJECTIVES, NOUNS, STATES  # noqa: E402
+
+'''
+Distributions
+    Real catalogs are skewed, so the generator is too:
+        items per merchant      Zipf: a few merchants list most items
+        item popularity         Zipf: a few items collect most favorites
+                                and purchases
+        favorites per customer  geometric around FAVORITES_MEAN, many
+                                customers have none, a few have dozens
+        purchases per customer  geometric around PURCHASES_MEAN, half of
+                                them among the customer's favorites
+        prices                  log-normal, median around 60
+'''
+
+ZIPF_EXPONENT = 1.1
+FAVORITES_MEAN = 8
+PURCHASES_MEAN = 3
+BATCH = 20000
+
+
+class ZipfSampler(object):
+    '''Draws 0..n-1, rank r with a weight of 1 / (r + 1) ** exponent'''
+
+    def __init__(self, n, rng, exponent=ZIPF_EXPONENT):
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(
+            1 / (rank + 1) ** exponent for rank in range(n)))
+
+    def __call__(self):
+        total = self.cum_weights[-1]
+        return bisect.bisect(self.cum_weights, self.rng.random() * total)
+
+
+def geometric(rng, mean):
+    '''0, 1, 2... with the given mean, most often 0'''
+    p = 1 / (mean + 1)
+    count = 0
+    while rng.random() > p:
+        count += 1
+    return count
+
+
+def make_config(url):
+    from config import Config, engine_options
+
+    class SyntheticConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options(url)
+    return SyntheticConfig
+
+
+def insert_batches(table, rows):
+    from models import db
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+    db.session.commit()
+
+
+def merchant_rows(merchants, rng):
+    for i in range(merchants):
+        yield {
+            'name': f'Merchant {i}',
+            'city': f'City {i % 50}',
+            'state': STATES[i % len(STATES)],
+            'phone': f'555{i:07d}',
+            'email': f'merchant{i}@example.com',
+            'description': f'{rng.choice(ADJECTIVES).title()} '
+                           f'{rng.choice(NOUNS)}s and more',
+        }
+
+
+def item_rows(items, merchant_ids, rng):
+    pick_merchant = ZipfSampler(len(merchant_ids), rng)
+    for _ in range(items):
+        words = rng.sample(ADJECTIVES, 2) + [rng.choice(NOUNS)]
+        yield {
+            'name': ' '.join(words[1:]),
+            'price': round(rng.lognormvariate(4.1, 0.8), 2),
+            'description': f'A {words[0]} {words[2]} from the '
+                           f'{rng.choice(ADJECTIVES)} collection',
+            'merchant_id': merchant_ids[pick_merchant()],
+        }
+
+
+def customer_rows(customers):
+    for i in range(customers):
+        yield {'name': f'Customer {i}',
+               'email': f'customer{i}@example.com'}
+
+
+def customer_item_rows(customer_ids, item_ids, rng):
+    '''(favorites, purchases) rows of every customer'''
+    # Popular items spread over the catalog, not the first ids
+    ranked = list(item_ids)
+    rng.shuffle(ranked)
+    pick_item = ZipfSampler(len(ranked), rng)
+    favorites, purchases = [], []
+    for customer_id in customer_ids:
+        liked = {ranked[pick_item()]
+                 for _ in range(geometric(rng, FAVORITES_MEAN))}
+        bought = set()
+        for _ in range(geometric(rng, PURCHASES_MEAN)):
+            if liked and rng.random() < 0.5:
+                bought.add(rng.choice(sorted(liked)))
+            else:
+                bought.add(ranked[pick_item()])
+        favorites += [{'customer_id': customer_id, 'item_id': item_id}
+                      for item_id in sorted(liked)]
+        purchases += [{'customer_id': customer_id, 'item_id': item_id}
+                      for item_id in sorted(bought)]
+    return favorites, purchases
+
+
+def generate(app, merchants, items, customers, seed=0):
+    '''Fills the app's database, returns the number of rows per table'''
+    from models import db, Merchant, Item, Customer
+    from models import favorite_items_table, purchased_items_table
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.create_all()
+        insert_batches(Merchant.__table__, merchant_rows(merchants, rng))
+        merchant_ids = [id for id, in db.session.query(Merchant.id)
+                        .order_by(Merchant.id)]
+        insert_batches(Item.__table__, item_rows(items, merchant_ids, rng))
+        insert_batches(Customer.__table__, customer_rows(customers))
+        item_ids = [id for id, in db.session.query(Item.id)
+                    .order_by(Item.id)]
+        customer_ids = [id for id, in db.session.query(Customer.id)
+                        .order_by(Customer.id)]
+        favorites, purchases = customer_item_rows(
+            customer_ids, item_ids, rng)
+        insert_batches(favorite_items_table, favorites)
+        insert_batches(purchased_items_table, purchases)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+    return {'merchants': merchants, 'items': items,
+            'customers': customers, 'favorites': len(favorites),
+            'purchases': len(purchases)}
+
+
+@contextlib.contextmanager
+def throwaway_postgres():
+    '''Runs a temporary Postgres cluster, yields its URL'''
+    bin_dir = os.environ.get('PG_BIN')
+    initdb = os.path.join(bin_dir, 'initdb') if bin_dir \
+        else shutil.which('initdb')
+    pg_ctl = os.path.join(bin_dir, 'pg_ctl') if bin_dir \
+        else shutil.which('pg_ctl')
+    if not initdb or not pg_ctl:
+        raise RuntimeError('initdb and pg_ctl not found: add them to the '
+                           'PATH or set PG_BIN')
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, 'data')
+        port = free_port()
+        subprocess.run([initdb, '-D', data, '-U', 'postgres', '-A', 'trust',
+                        '-E', 'UTF8', '--no-sync'],
+                       check=True, stdout=subprocess.DEVNULL)
+        # Durability off: the cluster is thrown away anyway
+        options = (f'-p {port} -k {tmp} -c listen_addresses=127.0.0.1 '
+                   '-c fsync=off -c synchronous_commit=off '
+                   '-c full_page_writes=off')
+        subprocess.run([pg_ctl, '-D', data, '-o', options, '-w',
+                        '-l', os.path.join(tmp, 'postgres.log'), 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        try:
+            yield f'postgresql://postgres@127.0.0.1:{port}/postgres'
+        finally:
+            subprocess.run([pg_ctl, '-D', data, '-m', 'immediate', 'stop'],
+                           stdout=subprocess.DEVNULL)
+
+
+@contextlib.contextmanager
+def database(url=None, sqlite=None, postgres=False):
+    '''The URL to fill: `url`, a SQLite file, or a throwaway Postgres'''
+    if url is not None:
+        yield url
+    elif postgres:
+        with throwaway_postgres() as url:
+            yield url
+    elif sqlite is not None:
+        yield f'sqlite:///{os.path.abspath(sqlite)}'
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            yield f'sqlite:///{os.path.join(tmp, "synthetic.db")}'
+
+
+def add_arguments(parser, postgres=True):
+    parser.add_argument('--merchants', type=int, default=200)
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--database-url')
+    target.add_argument('--sqlite', metavar='PATH')
+    if postgres:
+        target.add_argument('--postgres', action='store_true',
+                            help='start a throwaway Postgres cluster '
+                                 '(initdb and pg_ctl on the PATH or in '
+                                 'PG_BIN)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    add_arguments(parser, postgres=False)
+    args = parser.parse_args()
+    if args.database_url is None and args.sqlite is None:
+        parser.error('give --database-url or --sqlite')
+
+    from app import create_app
+
+    with database(args.database_url, args.sqlite) as url:
+        counts = generate(create_app(make_config(url)), args.merchants,
+                          args.items, args.customers, args.seed)
+    json.dump(counts, sys.stdout)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import time
+from base64 import urlsafe_b64encode
+
+import rsa
+from jose import jwt
+
+import auth
+
+'''
+LocalKey
+    An RS256 key pair generated locally, so benchmarks can mint
+    tokens and serve the matching JWKS without reaching Auth0
+'''
+
+
+def b64_uint(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+class LocalKey(object):
+    def __init__(self, kid='bench-key', bits=2048):
+        self.kid = kid
+        self.public, self.private = rsa.newkeys(bits)
+        self._private_pem = self.private.save_pkcs1().decode()
+
+    def jwk(self):
+        return {
+            'kty': 'RSA',
+            'kid': self.kid,
+            'use': 'sig',
+            'alg': 'RS256',
+            'n': b64_uint(self.public.n),
+            'e': b64_uint(self.public.e)
+        }
+
+    def jwks(self):
+        return {'keys': [self.jwk()]}
+
+    def token(self, permissions=(), expires_in=3600, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': f'https://{auth.AUTH0_DOMAIN}/',
+            'aud': auth.API_AUDIENCE,
+            'sub': 'auth0|bench',
+            'iat': now,
+            'exp': now + expires_in,
+            'permissions': list(permissions)
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self._private_pem, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+
+def use_local_key(key):
+    '''Point the auth module at a local key instead of the Auth0 tenant'''
+    auth.jwks_store.clear()
+    auth.jwks_store.fetcher = key.jwks
+    auth.token_cache.clear()
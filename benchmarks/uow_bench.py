@@ -0,0 +1,119 @@
+"""
+Transactions and latency of composite writes, with and without a unit
+of work.
+
+    python -m benchmarks.uow_bench --operations 200 --items 10
+
+Each operation onboards a merchant: inserts it, inserts its items,
+updates its description and adds the items to a customer's favorites.
+It runs once with every mutator committing on its own, then inside
+models.unit_of_work. Reports per mode the database commits and SQL
+statements per operation and the latency percentiles, as JSON lines.
+
+A throwaway SQLite file is used unless --database-url is given. SQLite
+syncs to disk on every commit, as Postgres does by default, so fewer
+commits show directly in the latency.
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('AUTH0_DOMAIN', 'jmw-dev.us.auth0.com')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'sideboard')
+
+from sqlalchemy import event  # noqa: E402
+
+from benchmarks.search_bench import percentile  # noqa: E402
+from benchmarks.synthetic import make_config  # noqa: E402
+
+
+def onboard_merchant(n, items, customer_id):
+    from models import Merchant, Item, add_customer_items
+    from models import favorite_items_table
+
+    merchant = Merchant(name=f'Merchant {n}', city='Portland',
+                        state='Oregon')
+    merchant.insert()
+    item_ids = []
+    for i in range(items):
+        item = Item(f'item {n}.{i}', 10.0 + i, merchant.id)
+        item.insert()
+        item_ids.append(item.id)
+    merchant.update(description=f'{items} items')
+    add_customer_items(favorite_items_table, customer_id, item_ids)
+
+
+def measure(app, mode, operations, items, offset):
+    from models import db, Customer, unit_of_work
+
+    counts = {'commits': 0, 'statements': 0}
+
+    def count_commit(conn):
+        counts['commits'] += 1
+
+    def count_statement(*args):
+        counts['statements'] += 1
+
+    with app.app_context():
+        customer = Customer(name='Bench Customer',
+                            email=f'bench{offset}@example.com')
+        customer.insert()
+        customer_id = customer.id
+        engine = db.engine
+        event.listen(engine, 'commit', count_commit)
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        timings = []
+        try:
+            for n in range(offset, offset + operations):
+                context = unit_of_work() if mode == 'unit_of_work' \
+                    else contextlib.nullcontext()
+                start = time.perf_counter()
+                with context:
+                    onboard_merchant(n, items, customer_id)
+                timings.append((time.perf_counter() - start) * 1000)
+                db.session.expunge_all()
+        finally:
+            event.remove(engine, 'commit', count_commit)
+            event.remove(engine, 'before_cursor_execute', count_statement)
+    return {
+        'mode': mode,
+        'operations': operations,
+        'commits_per_operation': counts['commits'] / operations,
+        'statements_per_operation': counts['statements'] / operations,
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'total_s': round(sum(timings) / 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--operations', type=int, default=200)
+    parser.add_argument('--items', type=int, default=10,
+                        help='items per merchant')
+    parser.add_argument('--database-url',
+                        help='an empty or throwaway database')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or \
+            f'sqlite:///{os.path.join(tmp, "uow_bench.db")}'
+        app = create_app(make_config(url))
+        with app.app_context():
+            db.create_all()
+        for i, mode in enumerate(('per_mutator', 'unit_of_work')):
+            print(json.dumps(measure(app, mode, args.operations,
+                                     args.items,
+                                     offset=i * args.operations)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, g, has_app_context, request
+from etags import not_modified, request_table_versions, with_etag
+
+'''
+Response cache
+    Read-through cache of serialized GET responses, keyed by path,
+    query string, the caller's permission scope and the current version
+    of every table the response is built from. The versions are those
+    of the table_versions table (see models), bumped by every commit in
+    the same transaction: a write in any worker changes the key, so
+    cached responses built from older data are never served again and
+    simply age out of the backend. A hit costs the one small query that
+    reads the versions, which conditional_get reuses for the ETag.
+'''
+
+
+class MemoryBackend(object):
+    '''In-process LRU with per-entry expiry'''
+
+    def __init__(self, maxsize=1024, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedBackend(object):
+    '''
+    Backend on a shared store with a Redis-like client (get, set with
+    ex=), so every worker sees the same entries
+    '''
+
+    def __init__(self, client, prefix='sideboard:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def clear(self):
+        pass
+
+
+class LocalStore(object):
+    '''
+    Stand-in for a Redis server, in memory, implementing the client
+    calls SharedBackend needs. Several backends sharing one LocalStore
+    behave like workers sharing one Redis.
+    '''
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (self.clock() + ex if ex else None, value)
+
+
+def make_backend(config):
+    name = config.get('RESPONSE_CACHE_BACKEND', 'memory')
+    if name == 'memory':
+        return MemoryBackend(maxsize=config.get('RESPONSE_CACHE_SIZE', 1024))
+    if name == 'redis':
+        import redis
+        return SharedBackend(redis.Redis.from_url(
+            config['RESPONSE_CACHE_URL']))
+    if name == 'local':
+        return SharedBackend(LocalStore())
+    if name == 'none':
+        return None
+    raise ValueError(f'Unknown response cache backend: {name}')
+
+
+class ResponseCache(object):
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, tables, versions=None):
+        '''
+        The entry of the current request, `versions` being the
+        {table: version} of `tables` if already read
+        '''
+        if versions is None:
+            versions = request_table_versions(tables)
+        scope = ','.join(sorted(getattr(g, 'permissions', ())))
+        versions = ','.join(f'{table}={versions[table]}'
+                            for table in sorted(tables))
+        raw = f'{request.full_path}|{scope}|{versions}'
+        return 'response:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        mimetype, etag, body = value.split(b'\n', 2)
+        return mimetype.decode('utf-8'), etag.decode('utf-8') or None, body
+
+    def set(self, key, mimetype, body, etag=None):
+        header = f'{mimetype}\n{etag or ""}\n'.encode('utf-8')
+        self.backend.set(key, header + body, self.ttl)
+
+
+def init_cache(app):
+    backend = make_backend(app.config)
+    if backend is not None:
+        app.extensions['response_cache'] = ResponseCache(
+            backend, ttl=app.config.get('RESPONSE_CACHE_TTL', 60))
+
+
+def get_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('response_cache')
+
+
+def hit_response(cached):
+    '''The response for a cache entry, 304 if the client has it'''
+    mimetype, etag, body = cached
+    if etag is None:
+        response = Response(body, mimetype=mimetype)
+    else:
+        response = not_modified(etag) or with_etag(
+            Response(body, mimetype=mimetype), etag)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def store_response(cache, key, response):
+    '''Caches a freshly built response under `key`'''
+    response = current_app.make_response(response)
+    if response.status_code == 200 and not response.is_streamed:
+        etag, _ = response.get_etag()
+        cache.set(key, response.mimetype, response.get_data(), etag)
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+
+def cached_response(*tables):
+    '''
+    Caches a GET view built from `tables`. Goes below requires_auth so
+    that the caller is authorized before anything is served, and above
+    conditional_get: a hit answers If-None-Match from the stored ETag
+    without querying the database.
+    '''
+    def cached_response_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None or 'stream' in request.args:
+                return f(*args, **kwargs)
+
+            key = cache.key(tables)
+            cached = cache.get(key)
+            if cached is not None:
+                return hit_response(cached)
+            return store_response(cache, key, f(*args, **kwargs))
+        return wrapper
+    return cached_response_decorator
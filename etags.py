@@ -0,0 +1,99 @@
+import hashlib
+from functools import wraps
+from flask import Response, current_app, request
+from models import get_table_versions
+
+'''
+Conditional GET
+    Responses carry a strong ETag derived from the request path and
+    query string and the versions of the tables they are built from
+    (see models.table_versions). A request whose If-None-Match matches
+    the current ETag gets a 304 after a single small query, without
+    running the listing query or serializing anything.
+
+    The versions are read before the data: a write committed in between
+    gives the response an older ETag than its content, which only costs
+    the client one more full download.
+'''
+
+
+def make_etag(*parts):
+    raw = '|'.join(str(part) for part in (request.full_path,) + parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def request_table_versions(tables):
+    '''
+    get_table_versions, read once per request: the response cache and
+    the ETag of a listing share the query
+    '''
+    read = request.environ.setdefault('sideboard.table_versions', {})
+    key = tuple(sorted(tables))
+    if key not in read:
+        read[key] = get_table_versions(tables)
+    return read[key]
+
+
+def versions_etag(tables, versions=None):
+    if versions is None:
+        versions = request_table_versions(tables)
+    return make_etag(*(f'{table}={versions[table]}'
+                       for table in sorted(versions)))
+
+
+def not_modified(etag):
+    '''The 304 response if the client already has `etag`, else None'''
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    response = current_app.make_response(response)
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        # Clients may keep the response but have to revalidate it
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_get(*tables):
+    '''
+    Answers a GET view built from `tables` with 304 when the client's
+    copy is current. Goes below requires_auth and cached_response
+    '''
+    def conditional_get_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if 'stream' in request.args:
+                return f(*args, **kwargs)
+            etag = versions_etag(tables)
+            response = not_modified(etag)
+            if response is not None:
+                return response
+            return with_etag(f(*args, **kwargs), etag)
+        return wrapper
+    return conditional_get_decorator
+
+
+def relationship_tables(model, relationships):
+    '''Tables read to nest `relationships` of `model`'''
+    tables = set()
+    for name in relationships:
+        relationship = model.__mapper__.relationships[name]
+        tables.add(relationship.mapper.local_table.name)
+        if relationship.secondary is not None:
+            tables.add(relationship.secondary.name)
+    return tables
+
+
+def entity_etag(model, updated_at, expand):
+    '''
+    An entity's ETag: its own updated_at and the versions of the tables
+    its expanded relationships come from
+    '''
+    tables = relationship_tables(model, expand)
+    versions = get_table_versions(tables) if tables else {}
+    return make_etag(updated_at.isoformat(), *(
+        f'{table}={versions[table]}' for table in sorted(versions)))
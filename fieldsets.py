@@ -0,0 +1,56 @@
+from flask import abort, request
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, selectinload
+
+'''
+Sparse fieldsets
+    `?fields=name,price` returns only those columns (plus id) and
+    `?expand=items` nests the listed relationships. Only the requested
+    columns are SELECTed and relationships are loaded (in one extra
+    query each) only when expanded. Without either parameter the
+    model's default shape is returned.
+'''
+
+
+def _list_arg(name, allowed):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    names = tuple(n.strip() for n in value.split(',') if n.strip())
+    unknown = [n for n in names if n not in allowed]
+    if unknown:
+        abort(400, description='Unknown {}: {}. Allowed: {}.'.format(
+            name, ', '.join(unknown), ', '.join(allowed)))
+    return names
+
+
+def fieldset_args(model, default_expand=None):
+    '''
+    Returns the (fields, expand) requested for `model`. Without
+    ?expand, relationships default to `default_expand` (the model's
+    DEFAULT_EXPAND if None)
+    '''
+    fields = _list_arg('fields', model.FIELDS)
+    expand = _list_arg('expand', model.RELATIONSHIPS)
+    if fields is None:
+        fields = model.DEFAULT_FIELDS
+    if expand is None:
+        if default_expand is None:
+            default_expand = model.DEFAULT_EXPAND
+        # A sparse fieldset leaves out relationships unless expanded
+        expand = default_expand if 'fields' not in request.args else ()
+    return fields, expand
+
+
+def apply_fieldset(query, model, fields, expand):
+    columns = [getattr(model, field) for field in fields]
+    query = query.options(load_only(*columns))
+    for relationship in expand:
+        query = query.options(selectinload(getattr(model, relationship)))
+    return query
+
+
+def select_fieldset(model, fields):
+    '''Core SELECT of id plus `fields`, for listings without expansion'''
+    columns = [model.id] + [getattr(model, field) for field in fields]
+    return select(*columns)
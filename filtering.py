@@ -0,0 +1,155 @@
+import re
+from flask import abort, request
+from models import Item, Merchant, Customer
+
+'''
+Filtering and sorting
+    Collection endpoints take the whitelisted filters declared below
+    for their model, and `sort=<column>` or `sort=-<column>` (descending)
+    on one of the model's SORTS. Both compile into the WHERE and
+    ORDER BY of the listing query, whatever the fieldset or paging.
+
+    Every filter and sort column is backed by an index. Range filters
+    are not selective though: on a wide range Postgres reads the whole
+    table, so they are only accepted together with a selective filter or
+    a `limit`, where the scan stops after one page.
+'''
+
+
+class Filter(object):
+    '''
+    A query parameter compiled into a condition on `column`: one of
+    eq, in (comma separated values), ge, le or prefix. `join` is the
+    (model, onclause) to join to reach the column
+    '''
+
+    def __init__(self, column, op, type=str, join=None, selective=True):
+        self.column = column
+        self.op = op
+        self.type = type
+        self.join = join
+        self.selective = selective
+
+    def parse(self, name, value):
+        values = value.split(',') if self.op == 'in' else [value]
+        try:
+            values = [self.type(v.strip()) for v in values if v.strip()]
+        except ValueError:
+            abort(400, description=f'{name} must be of type '
+                                   f'{self.type.__name__}.')
+        if not values:
+            abort(400, description=f'{name} must not be empty.')
+        return values if self.op == 'in' else values[0]
+
+    def condition(self, value):
+        if self.op == 'eq':
+            return self.column == value
+        if self.op == 'in':
+            return self.column.in_(value)
+        if self.op == 'ge':
+            return self.column >= value
+        if self.op == 'le':
+            return self.column <= value
+        if self.op == 'prefix':
+            # The whole pattern as one literal, so that the planner can
+            # use the prefix index even with server-side parameters
+            escaped = re.sub(r'([/%_])', r'/\1', value)
+            return self.column.like(escaped + '%', escape='/')
+        raise ValueError(f'Unknown filter operator: {self.op}')
+
+
+ITEM_MERCHANT = (Merchant, Merchant.id == Item.merchant_id)
+
+FILTERS = {
+    Item: {
+        'merchant_id': Filter(Item.merchant_id, 'in', int),
+        'price_min': Filter(Item.price, 'ge', float, selective=False),
+        'price_max': Filter(Item.price, 'le', float, selective=False),
+        'state': Filter(Merchant.state, 'eq', join=ITEM_MERCHANT),
+        'name_prefix': Filter(Item.name, 'prefix'),
+    },
+    Merchant: {
+        'state': Filter(Merchant.state, 'eq'),
+        'name_prefix': Filter(Merchant.name, 'prefix'),
+    },
+    Customer: {
+        'name_prefix': Filter(Customer.name, 'prefix'),
+    },
+}
+
+# Sortable columns: indexed, not nullable, so keyset paging works on them
+SORTS = {
+    Item: {'id': Item.id, 'price': Item.price},
+    Merchant: {'id': Merchant.id, 'name': Merchant.name},
+    Customer: {'id': Customer.id, 'email': Customer.email},
+}
+
+
+def filter_args(model):
+    '''Returns the [(Filter, value)] requested for `model`'''
+    allowed = FILTERS.get(model, {})
+    requested = []
+    for name, filter in allowed.items():
+        value = request.args.get(name)
+        if value is not None:
+            requested.append((filter, filter.parse(name, value)))
+    return requested
+
+
+def sort_arg(model):
+    '''Returns (column, descending) for `?sort=`, None for the default'''
+    value = request.args.get('sort')
+    if value is None:
+        return None
+    name = value[1:] if value.startswith('-') else value
+    allowed = SORTS.get(model, {})
+    if name not in allowed:
+        abort(400, description='Cannot sort by {}. Allowed: {}.'.format(
+            name, ', '.join(allowed)))
+    return allowed[name], value.startswith('-')
+
+
+def check_selective(filters, paged):
+    '''Rejects filters that would read the whole table'''
+    if filters and not paged and \
+            not any(filter.selective for filter, _ in filters):
+        abort(400, description='Range filters need a limit or a '
+                               'selective filter.')
+
+
+def apply_filters(query, filters):
+    '''Adds the filters to an ORM query or a Core select'''
+    joined = set()
+    for filter, value in filters:
+        if filter.join is not None and filter.join[0] not in joined:
+            query = query.join(*filter.join)
+            joined.add(filter.join[0])
+        query = query.filter(filter.condition(value))
+    return query
+
+
+def parse_cursor(sort):
+    '''
+    `after` of a sorted page: the id for the id column, else
+    "<value>,<id>" of the last row of the previous page
+    '''
+    value = request.args.get('after')
+    if value is None:
+        return None
+    column, _ = sort
+    try:
+        if column.key == 'id':
+            return int(value)
+        value, last_id = value.rsplit(',', 1)
+        return column.type.python_type(value), int(last_id)
+    except ValueError:
+        abort(400, description='after must be the next_cursor of the '
+                               'previous page.')
+
+
+def format_cursor(cursor):
+    '''next_cursor of a sorted page, as parse_cursor reads it back'''
+    if isinstance(cursor, tuple):
+        value, last_id = cursor
+        return f'{value!s},{last_id}'
+    return cursor
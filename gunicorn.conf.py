@@ -0,0 +1,77 @@
+"""
+Gunicorn settings for SideBoard.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Environment:
+    WEB_CONCURRENCY        worker processes (default: 2 * CPUs + 1)
+    GUNICORN_WORKER_CLASS  gthread (default), sync or gevent
+    GUNICORN_THREADS       threads per gthread worker (default: 4)
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests
+    GUNICORN_TIMEOUT       seconds before a silent worker is restarted
+    PORT                   port to bind (set by Heroku)
+
+The worker and thread counts are exported back to the environment
+before the app is loaded, so config.engine_options sizes each worker's
+connection pool to match.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+workers = _env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = _env_int('GUNICORN_THREADS', 4) \
+    if worker_class == 'gthread' else 1
+
+if worker_class == 'gevent':
+    # Patch before the app (and its locks and sockets) is imported
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+    # Greenlets per worker; each may hold a database connection
+    worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+    db_concurrency = _env_int('DB_POOL_SIZE', 10)
+else:
+    db_concurrency = threads
+
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(db_concurrency)
+
+# Load the app once in the master, workers fork with it already imported
+preload_app = True
+
+# Recycle workers to bound memory growth, jittered so they don't all
+# restart at once
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER',
+                               max_requests // 10)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading belong to the master; each
+    # worker must open its own rather than share those sockets. Not
+    # closed here (close=False): closing would end the sessions the
+    # master and the other workers still hold through the same sockets
+    from models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
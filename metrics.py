@@ -0,0 +1,224 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+'''
+Metrics
+    In-process counters and histograms, rendered in the Prometheus text
+    format by the /metrics endpoint. Every worker process keeps its own
+    numbers; scrape each worker (or aggregate) accordingly.
+'''
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def render(self, name, labels=''):
+        '''Prometheus histogram lines, buckets being cumulative'''
+        sep = ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} '
+                         f'{cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} '
+                     f'{self.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+'''
+Connection pool metrics
+    InstrumentedQueuePool times how long each checkout waits for a
+    connection. Together with the pool gauges this shows when the pool
+    is saturated and requests queue for connections.
+'''
+
+
+class PoolMetrics(object):
+    def __init__(self):
+        self.wait = Histogram()
+        self.timeouts = 0
+
+    def reset(self):
+        self.__init__()
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            pool_metrics.wait.observe(time.perf_counter() - start)
+            raise
+        pool_metrics.wait.observe(time.perf_counter() - start)
+        return conn
+
+
+def pool_stats(pool):
+    if not isinstance(pool, QueuePool):
+        return None
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_out': checked_out,
+        'overflow': max(pool.overflow(), 0),
+        'saturation': checked_out / capacity if capacity else 0.0
+    }
+
+
+def render_pool_metrics(pool):
+    lines = [
+        '# HELP sideboard_db_pool_checkout_wait_seconds '
+        'Time spent waiting for a pooled connection.',
+        '# TYPE sideboard_db_pool_checkout_wait_seconds histogram',
+    ]
+    lines += pool_metrics.wait.render(
+        'sideboard_db_pool_checkout_wait_seconds')
+    lines += [
+        '# HELP sideboard_db_pool_timeouts_total '
+        'Checkouts that gave up after the pool timeout.',
+        '# TYPE sideboard_db_pool_timeouts_total counter',
+        f'sideboard_db_pool_timeouts_total {pool_metrics.timeouts}',
+    ]
+    stats = pool_stats(pool)
+    if stats is not None:
+        for key, help_text in (
+                ('size', 'Connections kept open by the pool.'),
+                ('max_overflow', 'Extra connections allowed.'),
+                ('checked_out', 'Connections currently in use.'),
+                ('overflow', 'Extra connections currently open.'),
+                ('saturation', 'Connections in use / pool capacity.')):
+            name = f'sideboard_db_pool_{key}'
+            lines += [f'# HELP {name} {help_text}',
+                      f'# TYPE {name} gauge',
+                      f'{name} {stats[key]}']
+    return lines
+
+
+'''
+Request metrics
+    Per-endpoint histograms of the request timings recorded by
+    timing.py: the total duration, the time in each phase (auth, db,
+    serialize) and the number of SQL statements. Labelled by Flask
+    endpoint name, not by path, to keep the number of series bounded.
+'''
+
+# Upper bounds of the statements-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestMetrics(object):
+    def __init__(self):
+        self.duration = {}
+        self.phases = {}
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.__init__()
+
+    def _histogram(self, histograms, key, buckets=DEFAULT_BUCKETS):
+        histogram = histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def observe(self, endpoint, total, phases, queries):
+        self._histogram(self.duration, endpoint).observe(total)
+        for phase, seconds in phases.items():
+            self._histogram(self.phases, (endpoint, phase)).observe(seconds)
+        self._histogram(self.queries, endpoint,
+                        QUERY_COUNT_BUCKETS).observe(queries)
+
+
+request_metrics = RequestMetrics()
+
+
+def render_request_metrics():
+    lines = [
+        '# HELP sideboard_request_duration_seconds '
+        'Time from the start to the end of a request.',
+        '# TYPE sideboard_request_duration_seconds histogram',
+    ]
+    for endpoint, histogram in sorted(request_metrics.duration.items()):
+        lines += histogram.render('sideboard_request_duration_seconds',
+                                  f'endpoint="{endpoint}"')
+    lines += [
+        '# HELP sideboard_request_phase_seconds '
+        'Time spent in one phase (auth, db, serialize) of a request.',
+        '# TYPE sideboard_request_phase_seconds histogram',
+    ]
+    for (endpoint, phase), histogram in sorted(
+            request_metrics.phases.items()):
+        lines += histogram.render('sideboard_request_phase_seconds',
+                                  f'endpoint="{endpoint}",phase="{phase}"')
+    lines += [
+        '# HELP sideboard_request_queries '
+        'SQL statements executed by a request.',
+        '# TYPE sideboard_request_queries histogram',
+    ]
+    for endpoint, histogram in sorted(request_metrics.queries.items()):
+        lines += histogram.render('sideboard_request_queries',
+                                  f'endpoint="{endpoint}"')
+    return lines
+
+
+'''
+Token cache
+    The hits, misses and size of the verified token cache (see
+    TokenCache in auth.py), passed in as its stats().
+'''
+
+
+def render_token_cache_metrics(stats):
+    lines = []
+    for key, kind, help_text in (
+            ('hits', 'counter', 'Tokens found verified in the cache.'),
+            ('misses', 'counter', 'Tokens verified against the JWKS.'),
+            ('size', 'gauge', 'Verified tokens currently cached.'),
+            ('maxsize', 'gauge', 'Verified tokens the cache can hold.')):
+        name = f'sideboard_token_cache_{key}'
+        if kind == 'counter':
+            name += '_total'
+        lines += [f'# HELP {name} {help_text}',
+                  f'# TYPE {name} {kind}',
+                  f'{name} {stats[key]}']
+    return lines
+
+
+def render_metrics(engine, token_cache_stats=None):
+    lines = render_pool_metrics(engine.pool) + render_request_metrics()
+    if token_cache_stats is not None:
+        lines += render_token_cache_metrics(token_cache_stats)
+    return '\n'.join(lines) + '\n'
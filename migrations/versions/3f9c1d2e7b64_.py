@@ -0,0 +1,77 @@
+"""Add indexes on foreign key, reverse join table and lookup columns.
+
+Revision ID: 3f9c1d2e7b64
+Revises: a3db4b427927
+Create Date: 2026-10-18 10:12:41.208317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d2e7b64'
+down_revision = 'a3db4b427927'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, and
+    # doesn't block writes to the tables while the index is built
+    with op.get_context().autocommit_block():
+        op.create_index('ix_items_merchant_id', 'items', ['merchant_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_favorites_item_id_customer_id', 'favorites',
+                        ['item_id', 'customer_id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_purchased_item_id_customer_id', 'purchased',
+                        ['item_id', 'customer_id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_customers_email', 'customers', ['email'],
+                        unique=False, postgresql_concurrently=True)
+        if postgres:
+            # Substring / ILIKE search on names
+            op.create_index('ix_items_name_trgm', 'items', ['name'],
+                            unique=False, postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'},
+                            postgresql_concurrently=True)
+            op.create_index('ix_merchants_name_trgm', 'merchants', ['name'],
+                            unique=False, postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'},
+                            postgresql_concurrently=True)
+            # Prefix (LIKE 'abc%') search, whatever the collation
+            op.create_index('ix_items_name_prefix', 'items', ['name'],
+                            unique=False,
+                            postgresql_ops={'name': 'varchar_pattern_ops'},
+                            postgresql_concurrently=True)
+            op.create_index('ix_merchants_name_prefix', 'merchants',
+                            ['name'], unique=False,
+                            postgresql_ops={'name': 'varchar_pattern_ops'},
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        if postgres:
+            op.drop_index('ix_merchants_name_prefix', table_name='merchants',
+                          postgresql_concurrently=True)
+            op.drop_index('ix_items_name_prefix', table_name='items',
+                          postgresql_concurrently=True)
+            op.drop_index('ix_merchants_name_trgm', table_name='merchants',
+                          postgresql_concurrently=True)
+            op.drop_index('ix_items_name_trgm', table_name='items',
+                          postgresql_concurrently=True)
+        op.drop_index('ix_customers_email', table_name='customers',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_purchased_item_id_customer_id',
+                      table_name='purchased', postgresql_concurrently=True)
+        op.drop_index('ix_favorites_item_id_customer_id',
+                      table_name='favorites', postgresql_concurrently=True)
+        op.drop_index('ix_items_merchant_id', table_name='items',
+                      postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""Full-text search index on item names and descriptions.
+
+Revision ID: 5e0a7c3b9d21
+Revises: 8d2b6f0a4c19
+Create Date: 2026-10-18 15:02:13.674205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0a7c3b9d21'
+down_revision = '8d2b6f0a4c19'
+branch_labels = None
+depends_on = None
+
+# Same expression as models.ITEM_SEARCH_DOCUMENT, which the search
+# queries must match to use the index
+ITEM_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', items.name), 'A') || "
+    "setweight(to_tsvector('english', coalesce(items.description, '')),"
+    " 'B')")
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_search '
+                   f'ON items USING gin (({ITEM_SEARCH_DOCUMENT}))')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_items_search')
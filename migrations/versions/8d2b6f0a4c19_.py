@@ -0,0 +1,41 @@
+"""updated_at on merchants, items and customers, and the table_versions
+change counters behind the ETags.
+
+Revision ID: 8d2b6f0a4c19
+Revises: c71e4a9d05b2
+Create Date: 2026-10-18 14:26:40.118392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2b6f0a4c19'
+down_revision = 'c71e4a9d05b2'
+branch_labels = None
+depends_on = None
+
+TABLES = ('merchants', 'items', 'customers')
+
+
+def upgrade():
+    op.create_table('table_versions',
+                    sa.Column('table_name', sa.String(length=64),
+                              nullable=False),
+                    sa.Column('shard', sa.Integer(), autoincrement=False,
+                              nullable=False),
+                    sa.Column('version', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('table_name', 'shard'))
+    # Existing rows get the migration time (a constant default, no
+    # table rewrite on Postgres 11+)
+    for table in TABLES:
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text('now()')))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
+    op.drop_table('table_versions')
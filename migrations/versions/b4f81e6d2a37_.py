@@ -0,0 +1,39 @@
+"""Indexes behind the collection filters and sort orders: item price,
+merchant state and customer name prefix.
+
+Revision ID: b4f81e6d2a37
+Revises: 5e0a7c3b9d21
+Create Date: 2026-10-18 16:11:52.093418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4f81e6d2a37'
+down_revision = '5e0a7c3b9d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_items_price_id', 'items', ['price', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_merchants_state', 'merchants', ['state'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_customers_name_prefix', 'customers', ['name'],
+                        unique=False,
+                        postgresql_ops={'name': 'varchar_pattern_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_customers_name_prefix', table_name='customers',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_merchants_state', table_name='merchants',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_items_price_id', table_name='items',
+                      postgresql_concurrently=True)
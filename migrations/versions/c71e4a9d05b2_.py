@@ -0,0 +1,40 @@
+"""Cascade deletes in the database: items with their merchant, favorites
+and purchases with their customer or item.
+
+Revision ID: c71e4a9d05b2
+Revises: 3f9c1d2e7b64
+Create Date: 2026-10-18 11:03:27.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71e4a9d05b2'
+down_revision = '3f9c1d2e7b64'
+branch_labels = None
+depends_on = None
+
+# (constraint, table, column, referred table), named as Postgres named
+# the unnamed constraints of the initial migrations
+FOREIGN_KEYS = (
+    ('items_merchant_id_fkey', 'items', 'merchant_id', 'merchants'),
+    ('favorites_customer_id_fkey', 'favorites', 'customer_id', 'customers'),
+    ('favorites_item_id_fkey', 'favorites', 'item_id', 'items'),
+    ('purchased_customer_id_fkey', 'purchased', 'customer_id', 'customers'),
+    ('purchased_item_id_fkey', 'purchased', 'item_id', 'items'),
+)
+
+
+def upgrade():
+    for name, table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'],
+                              ondelete='CASCADE')
+
+
+def downgrade():
+    for name, table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'])
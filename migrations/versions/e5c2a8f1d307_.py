@@ -0,0 +1,39 @@
+"""Keep purchases: favorites and purchases no longer cascade from items
+and customers. The application deletes favorites and a customer's
+lists itself, and purchased items can't be deleted.
+
+Revision ID: e5c2a8f1d307
+Revises: b4f81e6d2a37
+Create Date: 2026-10-18 21:40:12.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c2a8f1d307'
+down_revision = 'b4f81e6d2a37'
+branch_labels = None
+depends_on = None
+
+# (constraint, table, column, referred table), as in c71e4a9d05b2
+FOREIGN_KEYS = (
+    ('favorites_customer_id_fkey', 'favorites', 'customer_id', 'customers'),
+    ('favorites_item_id_fkey', 'favorites', 'item_id', 'items'),
+    ('purchased_customer_id_fkey', 'purchased', 'customer_id', 'customers'),
+    ('purchased_item_id_fkey', 'purchased', 'item_id', 'items'),
+)
+
+
+def upgrade():
+    for name, table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'])
+
+
+def downgrade():
+    for name, table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'],
+                              ondelete='CASCADE')
@@ -1,12 +1,192 @@
 from sqlalchemy import Table, Column, String, Integer, Float, ForeignKey
+from sqlalchemy import BigInteger, DateTime
+from sqlalchemy import DDL, Index, event, exists, func, literal_column
+from sqlalchemy import select
+from sqlalchemy import bindparam, cast, column, values
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import relationship
+from flask import current_app, request
 from flask_sqlalchemy import SQLAlchemy
+from contextlib import ContextDecorator
+from datetime import datetime
+from functools import wraps
 import json
 import os
+import random
 import re
+import sqlite3
 
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys (and ON DELETE CASCADE) unless asked
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+# Trigram indexes on names need the pg_trgm extension
+event.listen(db.metadata, 'before_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(
+        dialect='postgresql'))
+
+
+'''
+Write tracking
+    Every committed write is reported to the functions in
+    table_change_listeners with the set of table names it touched,
+    whether it came from the model mutators (insert/update/delete),
+    a bulk statement or an ON DELETE CASCADE in the database. Caches
+    use this to invalidate what depends on those tables.
+'''
+
+table_change_listeners = []
+
+
+def _cascaded_tables(tables):
+    '''Adds the tables the database deletes from via ON DELETE CASCADE'''
+    tables = set(tables)
+    pending = list(tables)
+    while pending:
+        name = pending.pop()
+        for table in db.metadata.tables.values():
+            if table.name in tables:
+                continue
+            for fk in table.foreign_keys:
+                if fk.ondelete == 'CASCADE' and \
+                        fk.column.table.name == name:
+                    tables.add(table.name)
+                    pending.append(table.name)
+                    break
+    return tables
+
+
+def _mark_changed(session, tables):
+    session.info.setdefault('changed_tables', set()).update(tables)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_flushed_tables(session, flush_context):
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + \
+            list(session.deleted):
+        mapper = getattr(obj, '__mapper__', None)
+        if mapper is None:
+            continue
+        tables.add(mapper.local_table.name)
+        # Association rows written through many-to-many collections
+        for rel in mapper.relationships:
+            if rel.secondary is not None:
+                tables.add(rel.secondary.name)
+    deleted = {obj.__table__.name for obj in session.deleted
+               if hasattr(obj, '__table__')}
+    _mark_changed(session, tables | _cascaded_tables(deleted))
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_executed_tables(state):
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    table = getattr(state.statement, 'table', None)
+    if table is None or table.name == table_versions.name:
+        return
+    tables = {table.name}
+    if state.is_delete:
+        tables = _cascaded_tables(tables)
+    _mark_changed(state.session, tables)
+
+
+'''
+Table versions
+    A change counter per table, stored in the database and bumped in
+    the same transaction as the write, so every worker sees the same
+    version as soon as the data is committed. Each table's counter is
+    split over VERSION_SHARDS rows and a commit bumps a random one:
+    concurrent writers to the same table (checkouts writing purchases)
+    rarely wait on each other's row lock. The version is the sum of
+    the shards, which grows with every commit.
+'''
+
+VERSION_SHARDS = 16
+
+table_versions = db.Table('table_versions',
+                          Column('table_name', String(64), primary_key=True),
+                          Column('shard', Integer, primary_key=True,
+                                 autoincrement=False),
+                          Column('version', BigInteger, nullable=False,
+                                 default=0))
+
+
+def _bump_versions(table_names):
+    # Always in the same order, so that bumps can't deadlock
+    rows = [{'table_name': table_name,
+             'shard': random.randrange(VERSION_SHARDS), 'version': 1}
+            for table_name in sorted(table_names)]
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(table_versions)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table_versions)
+    else:
+        # No upsert: the shard rows have to exist already
+        for row in rows:
+            db.session.execute(table_versions.update().values(
+                version=table_versions.c.version + 1).where(
+                table_versions.c.table_name == row['table_name'],
+                table_versions.c.shard == row['shard']))
+        return
+    stmt = stmt.values(rows)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['table_name', 'shard'],
+        set_={'version': table_versions.c.version + 1}))
+
+
+@event.listens_for(db.session, 'before_commit')
+def bump_table_versions(session):
+    # The commit flushes after this hook, flush first to see its writes
+    session.flush()
+    tables = session.info.get('changed_tables')
+    if tables:
+        _bump_versions(tables)
+
+
+def table_versions_query(tables):
+    return select(table_versions.c.table_name,
+                  func.sum(table_versions.c.version)) \
+        .where(table_versions.c.table_name.in_(tables)) \
+        .group_by(table_versions.c.table_name)
+
+
+def versions_from_rows(tables, rows):
+    '''{table: version} from the rows of table_versions_query(tables)'''
+    versions = {table_name: 0 for table_name in tables}
+    versions.update((table_name, int(version)) for table_name, version in rows)
+    return versions
+
+
+def get_table_versions(tables):
+    '''Current version of each of `tables`, in one query'''
+    return versions_from_rows(
+        tables, db.session.execute(table_versions_query(tables)))
+
+
+@event.listens_for(db.session, 'after_commit')
+def notify_changed_tables(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        for listener in table_change_listeners:
+            listener(tables)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_changed_tables(session):
+    session.info.pop('changed_tables', None)
+
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -17,10 +197,92 @@ def setup_db(app, config):
     app.config.from_object(config)
     db.app = app
     db.init_app(app)
-    # Note: This must be commented out when running migrations!
-    # Creating the tables interferes with the migration change
+    # Only for databases outside of migrations (the SQLite profiles):
+    # creating the tables interferes with the migration change
     # detection between the tables and the models
-    # db.create_all()
+    if app.config.get('CREATE_SCHEMA'):
+        with app.app_context():
+            db.create_all()
+
+
+'''
+Units of work
+    The mutators (insert, update, delete, bulk_insert, the customer list
+    helpers) end with commit(), which commits right away. Inside a
+    unit_of_work it doesn't: inserts are flushed (for their ids), other
+    changes wait for autoflush, and the transaction commits once when
+    the outermost unit of work exits, or rolls back if it raises.
+    Nested units of work join the outer one.
+
+        with unit_of_work():
+            merchant.insert()
+            Item('chair', 10.0, merchant.id).insert()
+            merchant.update(city='Portland')
+
+    One transaction instead of three: one fsync, one version bump and
+    one cache invalidation. With UNIT_OF_WORK_PER_REQUEST, every view
+    runs in a unit of work (see request_units_of_work), so a request
+    commits at most once.
+'''
+
+
+class unit_of_work(ContextDecorator):
+    def __enter__(self):
+        info = db.session.info
+        info['unit_of_work'] = info.get('unit_of_work', 0) + 1
+        return db.session
+
+    def __exit__(self, exc_type, exc, tb):
+        info = db.session.info
+        info['unit_of_work'] -= 1
+        if info['unit_of_work']:
+            return False
+        del info['unit_of_work']
+        if exc_type is not None:
+            db.session.rollback()
+            return False
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return False
+
+
+def in_unit_of_work():
+    return bool(db.session.info.get('unit_of_work'))
+
+
+def commit(flush=False):
+    '''
+    Commits the session, or inside a unit_of_work leaves that to its
+    end, only flushing if `flush`
+    '''
+    if not in_unit_of_work():
+        db.session.commit()
+    elif flush:
+        db.session.flush()
+
+
+def request_units_of_work(app):
+    '''
+    Wraps the views of `app` to run each write request in a
+    unit_of_work when UNIT_OF_WORK_PER_REQUEST is set. Errors, including
+    those of the final commit, still reach the app's error handlers
+    '''
+    for endpoint, view in app.view_functions.items():
+        app.view_functions[endpoint] = _request_unit_of_work(view)
+
+
+def _request_unit_of_work(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or \
+                not current_app.config.get('UNIT_OF_WORK_PER_REQUEST'):
+            return view(*args, **kwargs)
+        with unit_of_work():
+            return view(*args, **kwargs)
+    return wrapper
 
 
 '''
@@ -35,6 +297,127 @@ def db_drop_and_create_all():
     db.create_all()
 
 
+'''
+bulk_insert(model, rows)
+    inserts a list of column dicts in a single transaction and returns
+    the new ids in order. On Postgres the ids are taken from the id
+    sequence first, with one query, and inserted with the rows in
+    multi-row INSERTs: the order INSERT ... RETURNING yields its rows in
+    is not guaranteed to be the order of the VALUES
+'''
+
+
+def bulk_insert(model, rows, chunk_size=1000):
+    if not rows:
+        return []
+    table = model.__table__
+    # Multi-row VALUES need the same keys on every row
+    keys = set()
+    for row in rows:
+        keys.update(row)
+    rows = [{key: row.get(key) for key in keys} for row in rows]
+
+    ids = []
+    if db.engine.dialect.name == 'postgresql':
+        sequence = func.pg_get_serial_sequence(table.name, table.c.id.name)
+        # Sorted, so that ids still grow with the input order
+        ids = sorted(db.session.execute(
+            select(func.nextval(sequence)).select_from(
+                func.generate_series(1, len(rows)))).scalars())
+        rows = [dict(row, id=new_id) for row, new_id in zip(rows, ids)]
+        for start in range(0, len(rows), chunk_size):
+            db.session.execute(
+                table.insert().values(rows[start:start + chunk_size]))
+    else:
+        # No RETURNING (SQLite): still one transaction, ids per row
+        stmt = table.insert()
+        for row in rows:
+            result = db.session.execute(stmt, row)
+            ids.append(result.inserted_primary_key[0])
+    commit()
+    return ids
+
+
+'''
+bulk_update(model, rows, where=None)
+    applies a list of {'id': id, column: value} dicts in a single
+    transaction, rows changing the same columns together. Postgres
+    updates a chunk per statement, joined with UPDATE ... FROM
+    (VALUES ...) RETURNING the ids; other databases update row by row
+    and count the rows each statement changed. `where` further
+    restricts the rows updated. Returns the set of ids updated, without
+    committing: the caller commits once it has checked them
+'''
+
+
+def bulk_update(model, rows, where=None, chunk_size=1000):
+    table = model.__table__
+    groups = {}
+    for row in rows:
+        keys = tuple(sorted(key for key in row if key != 'id'))
+        groups.setdefault(keys, []).append(row)
+
+    updated = set()
+    for keys, group in groups.items():
+        if db.engine.dialect.name == 'postgresql':
+            for start in range(0, len(group), chunk_size):
+                chunk = group[start:start + chunk_size]
+                changes = values(
+                    *[column(key, table.c[key].type)
+                      for key in ('id',) + keys], name='changes').data(
+                    [tuple(row[key] for key in ('id',) + keys)
+                     for row in chunk])
+                # Casts: VALUES columns of NULLs only would be text
+                stmt = table.update().where(table.c.id == changes.c.id) \
+                    .values({key: cast(changes.c[key], table.c[key].type)
+                             for key in keys})
+                if where is not None:
+                    stmt = stmt.where(where)
+                updated.update(db.session.execute(
+                    stmt.returning(table.c.id)).scalars())
+        else:
+            # The SET clause comes from the keys of the parameters. On
+            # the session's connection directly: a statement per row
+            # costs less without the ORM execution around it
+            stmt = table.update().where(table.c.id == bindparam('_id'))
+            if where is not None:
+                stmt = stmt.where(where)
+            connection = db.session.connection()
+            for row in group:
+                params = {key: row[key] for key in keys}
+                params['_id'] = row['id']
+                if connection.execute(stmt, params).rowcount:
+                    updated.add(row['id'])
+            _mark_changed(db.session, {table.name})
+    return updated
+
+
+'''
+update_by_id(model, entity_id, values, fields)
+    updates one row with a single UPDATE ... RETURNING id and `fields`,
+    without loading it into the session. Returns the returned row, or
+    None if there is no row with that id. Instances of the row already
+    in the session are not refreshed
+'''
+
+
+def update_by_id(model, entity_id, values, fields):
+    table = model.__table__
+    columns = [table.c.id] + [table.c[field] for field in fields]
+    stmt = table.update().where(table.c.id == entity_id).values(values)
+    if db.engine.dialect.full_returning:
+        row = db.session.execute(stmt.returning(*columns)).first()
+    else:
+        # No UPDATE ... RETURNING (SQLite): read the row back in the
+        # same transaction
+        row = None
+        if db.session.execute(stmt).rowcount:
+            row = db.session.execute(
+                select(*columns).where(table.c.id == entity_id)).first()
+    commit()
+    return row
+
+
 """
 Customers can save their favorite items
 1 customer can have many favorites
@@ -45,7 +428,10 @@ favorite_items_table = db.Table('favorites',
                                 Column('customer_id', ForeignKey(
                                     'customers.id'), primary_key=True),
                                 Column('item_id', ForeignKey(
-                                    'items.id'), primary_key=True)
+                                    'items.id'), primary_key=True),
+                                # Who favorited item X
+                                Index('ix_favorites_item_id_customer_id',
+                                      'item_id', 'customer_id')
                                 )
 
 """
@@ -53,12 +439,17 @@ Customers can view purchased items
 1 customer can purchase many items
 1 item can be purchased by many customers
 Hence we have a many to many relation
+Purchases are kept: an item that was purchased can't be deleted, nor
+can its merchant
 """
 purchased_items_table = db.Table('purchased',
                                  Column('customer_id', ForeignKey(
                                      'customers.id'), primary_key=True),
                                  Column('item_id', ForeignKey(
-                                     'items.id'), primary_key=True)
+                                     'items.id'), primary_key=True),
+                                 # Who purchased item X
+                                 Index('ix_purchased_item_id_customer_id',
+                                       'item_id', 'customer_id')
                                  )
 
 """
@@ -66,26 +457,192 @@ purchased_items_table = db.Table('purchased',
 1 merchant can sell to many different customers
 """
 
+
+def name_prefix_index(table):
+    '''Prefix (LIKE 'abc%') search on a name column, whatever the collation'''
+    return Index(f'ix_{table}_name_prefix', 'name',
+                 postgresql_ops={'name': 'varchar_pattern_ops'})
+
+
+def name_search_indexes(table):
+    '''Trigram (substring) and prefix indexes on a name column'''
+    return (
+        Index(f'ix_{table}_name_trgm', 'name', postgresql_using='gin',
+              postgresql_ops={'name': 'gin_trgm_ops'}),
+        name_prefix_index(table),
+    )
+
+
+'''
+Item full-text search
+    The document searched for an item: its name (weight A) and
+    description (weight B), under the english text search configuration.
+    Queries must use exactly this expression to use the GIN index built
+    on it, so it is literal SQL rather than bound parameters.
+'''
+
+ITEM_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', items.name), 'A') || "
+    "setweight(to_tsvector('english', coalesce(items.description, '')),"
+    " 'B')")
+
+
+def item_search_document():
+    return literal_column(ITEM_SEARCH_DOCUMENT)
+
+
+'''
+Customer item lists
+    favorites and purchases are written straight to their association
+    tables: adding items is a single multi-row
+    INSERT ... ON CONFLICT DO NOTHING, so repeated or concurrent adds
+    of the same item don't fail, and listings are one JOIN from the
+    association table to items.
+'''
+
+
+def _insert_ignoring_duplicates(table):
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return table.insert().prefix_with('IGNORE')
+
+
+def add_customer_items(table, customer_id, item_ids):
+    '''Returns the number of items that weren't in the list yet'''
+    if not item_ids:
+        return 0
+    stmt = _insert_ignoring_duplicates(table).values([
+        {'customer_id': customer_id, 'item_id': item_id}
+        for item_id in item_ids])
+    result = db.session.execute(stmt)
+    commit()
+    return result.rowcount
+
+
+def remove_customer_item(table, customer_id, item_id):
+    '''Returns whether the item was in the list'''
+    result = db.session.execute(table.delete().where(
+        table.c.customer_id == customer_id, table.c.item_id == item_id))
+    commit()
+    return result.rowcount > 0
+
+
+def delete_favorites_of_items(*criteria):
+    '''Deletes the favorites rows of the items matching `criteria`'''
+    db.session.execute(favorite_items_table.delete().where(
+        favorite_items_table.c.item_id.in_(
+            select(Item.id).where(*criteria))))
+
+
+def items_purchased(*criteria):
+    '''Whether any item matching `criteria` has been purchased'''
+    return db.session.execute(select(exists().where(
+        purchased_items_table.c.item_id == Item.id, *criteria))).scalar()
+
+
+def select_customer_items(table, customer_id, fields):
+    '''Core SELECT of the items in a customer list, joined in one go'''
+    columns = [Item.id] + [getattr(Item, field) for field in fields]
+    return select(*columns) \
+        .join_from(table, Item, table.c.item_id == Item.id) \
+        .where(table.c.customer_id == customer_id)
+
+
+def updated_at_column():
+    '''
+    Last write time of a row. Set from Python (microseconds on every
+    database, applied to Core updates too); the server default covers
+    rows inserted outside the application
+    '''
+    return Column(DateTime, nullable=False, default=datetime.utcnow,
+                  onupdate=datetime.utcnow, server_default=func.now())
+
+
+'''
+FormatMixin
+    format() support for sparse fieldsets. Each model lists the columns
+    and relationships it can return, and the ones returned by default.
+    `fields` selects columns (id is always included) and `expand`
+    selects the relationships to nest; expanded objects are formatted
+    with their own defaults, without further expansion. update() writes
+    only the columns in FIELDS.
+'''
+
+
+class FormatMixin(object):
+    FIELDS = ()
+    DEFAULT_FIELDS = ()
+    RELATIONSHIPS = ()
+    DEFAULT_EXPAND = ()
+
+    def format(self, fields=None, expand=None):
+        if fields is None:
+            fields = self.DEFAULT_FIELDS
+        if expand is None:
+            expand = self.DEFAULT_EXPAND
+        formatted = {'id': self.id}
+        for field in fields:
+            formatted[field] = getattr(self, field)
+        for relationship in expand:
+            related = getattr(self, relationship)
+            if isinstance(related, list):
+                formatted[relationship] = [
+                    obj.format(expand=()) for obj in related]
+            else:
+                formatted[relationship] = related and \
+                    related.format(expand=())
+        return formatted
+
+    def update(self, **kwargs):
+        '''
+        Sets writable columns (FIELDS) only, checked like a PATCH body.
+        Raises ValueError with the {field: message} errors
+        '''
+        # validation imports this module
+        from validation import validate_row
+        values, errors = validate_row(type(self), kwargs,
+                                      partial_update=True)
+        if errors:
+            raise ValueError(errors)
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        commit()
+
+
 '''
 Merchant
 Contains contact info and a list of items
 '''
 
 
-class Merchant(db.Model):
+class Merchant(FormatMixin, db.Model):
     __tablename__ = 'merchants'
+    FIELDS = ('name', 'city', 'state', 'phone', 'email', 'fb_link',
+              'insta_link', 'image_link', 'description')
+    DEFAULT_FIELDS = FIELDS
+    RELATIONSHIPS = ('items',)
+    DEFAULT_EXPAND = ('items',)
+    __table_args__ = name_search_indexes('merchants')
+
     id = Column(Integer, primary_key=True)
     name = Column(String(80), unique=True, nullable=False)
     city = Column(String(120))
-    state = Column(String(120))
+    state = Column(String(120), index=True)
     phone = Column(String(120))
     email = Column(String(120))
     fb_link = Column(String(120))
     insta_link = Column(String(120))
     image_link = Column(String(500))
     description = Column(String(500))
+    updated_at = updated_at_column()
+    # The database deletes the items (ON DELETE CASCADE), the ORM
+    # doesn't load them to delete them one by one
     items = db.relationship("Item", backref="merchant",
-                            lazy=True, cascade="all, delete-orphan")
+                            lazy=True, cascade="all, delete-orphan",
+                            passive_deletes=True)
 
     def __init__(self, name, city=None, state=None,
                  phone=None, email=None, fb_link=None,
@@ -101,48 +658,55 @@ class Merchant(db.Model):
         self.description = description
         self.items = []
 
-    def format(self):
-        items_json = [item.format() for item in self.items]
-        return {
-            'id': self.id,
-            'name': self.name,
-            'city': self.city,
-            'state': self.state,
-            'phone': self.phone,
-            'email': self.email,
-            'fb_link': self.fb_link,
-            'insta_link': self.insta_link,
-            'image_link': self.image_link,
-            'description': self.description,
-            'items': items_json
-        }
-
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        commit(flush=True)
 
     def delete(self):
+        delete_favorites_of_items(Item.merchant_id == self.id)
         db.session.delete(self)
-        db.session.commit()
-
-    def update(self, **kwargs):
-        for attr, value in kwargs.items():
-            setattr(self, attr, value)
-        db.session.commit()
+        commit()
+
+    @classmethod
+    def delete_by_id(cls, merchant_id):
+        '''
+        Deletes a merchant and its items without loading them.
+        Returns the number of items deleted with it, None if not found
+        '''
+        # Locked first, so that no item is added and deleted uncounted
+        # by the cascade
+        found = db.session.execute(select(cls.id).where(
+            cls.id == merchant_id).with_for_update()).scalar()
+        if found is None:
+            return None
+        delete_favorites_of_items(Item.merchant_id == merchant_id)
+        deleted_items = db.session.execute(Item.__table__.delete().where(
+            Item.merchant_id == merchant_id)).rowcount
+        db.session.execute(cls.__table__.delete().where(cls.id == merchant_id))
+        commit()
+        return deleted_items
 
     def __repr__(self):
         return json.dumps(self.format())
 
 
-class Item(db.Model):
+class Item(FormatMixin, db.Model):
     __tablename__ = "items"
+    FIELDS = ('name', 'price', 'description', 'image_link', 'merchant_id')
+    DEFAULT_FIELDS = ('name', 'price', 'image_link', 'merchant_id')
+    RELATIONSHIPS = ('merchant',)
+    # Price filters and sort=price pages, keyset on (price, id)
+    __table_args__ = name_search_indexes('items') + (
+        Index('ix_items_price_id', 'price', 'id'),)
+
     id = Column(Integer, nullable=False, primary_key=True)
     name = Column(String(100), nullable=False)
     price = Column(Float, nullable=False)
     description = Column(String(500))
     image_link = Column(String(500))
     merchant_id = Column(Integer, db.ForeignKey(
-        'merchants.id'), nullable=False)
+        'merchants.id', ondelete='CASCADE'), nullable=False, index=True)
+    updated_at = updated_at_column()
     # Item.merchant exists via backref
 
     def __init__(self, name, price, merchant_id,
@@ -153,38 +717,40 @@ class Item(db.Model):
         self.image_link = image_link
         self.merchant_id = merchant_id
 
-    def format(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'price': self.price,
-            'image_link': self.image_link,
-            'merchant_id': self.merchant_id}
-
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        commit(flush=True)
 
     def delete(self):
+        delete_favorites_of_items(Item.id == self.id)
         db.session.delete(self)
-        db.session.commit()
-
-    def update(self, **kwargs):
-        for attr, value in kwargs.items():
-            setattr(self, attr, value)
-        db.session.commit()
+        commit()
 
     def __repr__(self):
         return json.dumps(self.format())
 
 
-class Customer(db.Model):
+event.listen(Item.__table__, 'after_create', DDL(
+    'CREATE INDEX ix_items_search ON items USING gin '
+    f'(({ITEM_SEARCH_DOCUMENT}))').execute_if(dialect='postgresql'))
+
+
+class Customer(FormatMixin, db.Model):
     __tablename__ = "customers"
+    FIELDS = ('name', 'email')
+    DEFAULT_FIELDS = FIELDS
+    RELATIONSHIPS = ('favorites', 'purchases')
+    DEFAULT_EXPAND = ('favorites', 'purchases')
+    __table_args__ = (name_prefix_index('customers'),)
+
     id = Column(Integer, nullable=False, primary_key=True)
     name = Column(String(100), nullable=False)
-    email = Column(String(100), nullable=False)
-    favorites = db.relationship("Item", secondary=favorite_items_table)
-    purchases = db.relationship("Item", secondary=purchased_items_table)
+    email = Column(String(100), nullable=False, index=True)
+    updated_at = updated_at_column()
+    favorites = db.relationship("Item", secondary=favorite_items_table,
+                                passive_deletes=True)
+    purchases = db.relationship("Item", secondary=purchased_items_table,
+                                passive_deletes=True)
 
     def __init__(self, name, email):
         self.name = name
@@ -192,26 +758,18 @@ class Customer(db.Model):
         self.favorites = []
         self.purchases = []
 
-    def format(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'email': self.email,
-            'favorites': self.favorites,
-            'purchases': self.purchases}
-
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        commit(flush=True)
 
     def delete(self):
+        # The customer's favorites and purchases go with them
+        for table in (favorite_items_table, purchased_items_table):
+            db.session.execute(table.delete().where(
+                table.c.customer_id == self.id))
+        db.session.expire(self, ['favorites', 'purchases'])
         db.session.delete(self)
-        db.session.commit()
-
-    def update(self, **kwargs):
-        for attr, value in kwargs.items():
-            setattr(self, attr, value)
-        db.session.commit()
+        commit()
 
     def __repr__(self):
         return json.dumps(self.format())
@@ -0,0 +1,97 @@
+from flask import abort, current_app, request
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from models import db
+
+'''
+Keyset pagination
+    Collection endpoints page on the primary key: `?limit=N&after=<id>`
+    returns the next N rows with id > after, using an index range scan
+    instead of OFFSET so every page costs the same. The response carries
+    `next_cursor`, the id to pass as `after` for the following page, or
+    null on the last page.
+'''
+
+
+def int_arg(name, minimum):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, description=f'{name} must be an integer.')
+    if value < minimum:
+        abort(400, description=f'{name} must be at least {minimum}.')
+    return value
+
+
+def page_args(parse_after=None):
+    '''
+    Returns (limit, after) for a paged request, or None when the client
+    didn't ask for paging and expects the whole collection. `after` is
+    an id unless `parse_after` reads another kind of cursor
+    '''
+    limit = int_arg('limit', 1)
+    after = parse_after() if parse_after else int_arg('after', 0)
+    if limit is None and after is None:
+        return None
+
+    max_limit = current_app.config['MAX_PAGE_SIZE']
+    if limit is None:
+        limit = current_app.config['DEFAULT_PAGE_SIZE']
+    if limit > max_limit:
+        abort(400, description=f'limit must be at most {max_limit}.')
+    return limit, after
+
+
+def fetch_all(query):
+    '''Runs an ORM query or a Core select and returns all rows'''
+    if isinstance(query, Query):
+        return query.all()
+    return db.session.execute(query).all()
+
+
+def keyset_page(query, column, limit, after=None):
+    '''Returns (rows, next_cursor) for the page of `query` after `after`'''
+    return sorted_keyset_page(query, column, False, column, limit, after)
+
+
+def sorted_keyset_page(query, column, descending, id_column, limit,
+                       after=None):
+    '''
+    keyset_page on another column than the id: rows are ordered by
+    (column, id) and `after` is the (value, id) of the last row seen,
+    or just the id when `column` is the id. Returns (rows, next_cursor)
+    in the same form
+    '''
+    rows = fetch_all(sorted_keyset_query(
+        query, column, descending, id_column, limit, after))
+    return split_page(rows, column, id_column, limit)
+
+
+def sorted_keyset_query(query, column, descending, id_column, limit,
+                        after=None):
+    '''The query of a sorted_keyset_page, for callers running it'''
+    if column is id_column:
+        key, order = column, [column]
+    else:
+        key, order = tuple_(column, id_column), [column, id_column]
+        after = after and tuple_(*after)
+    if descending:
+        order = [c.desc() for c in order]
+    if after is not None:
+        query = query.filter(key < after if descending else key > after)
+    # Fetch one extra row to know whether there is a next page
+    return query.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows, column, id_column, limit):
+    '''(rows, next_cursor) from the rows of a sorted_keyset_query'''
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last_id = getattr(rows[-1], id_column.key)
+    if column is id_column:
+        return rows, last_id
+    return rows, (getattr(rows[-1], column.key), last_id)
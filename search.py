@@ -0,0 +1,274 @@
+import re
+import threading
+from flask import abort, current_app, has_app_context, request
+from sqlalchemy import func, select
+from models import db, table_change_listeners, item_search_document
+from models import Item, Merchant
+from pagination import page_args
+
+'''
+Item search
+    GET /items/search?q=oak chair ranks items by how well their name
+    and description match the words in q (all of them have to match),
+    names counting more than descriptions. Optional filters narrow the
+    results down:
+        price_min, price_max   price range
+        merchant_id            one or more merchant ids, comma separated
+        city, state            the merchant's city and state
+    `facets=state,city,merchant_id` adds the number of matching items
+    for the most common values of each facet, to build filter menus.
+
+    On Postgres matching and ranking run on the ix_items_search GIN
+    index. Other databases (SQLite test runs) use a MemorySearchIndex
+    built from the items table and rebuilt after items change.
+
+    Results are paged with `limit` and `after`, where after is the
+    next_cursor of the previous page (an offset into the ranking).
+'''
+
+FACETS = {
+    'merchant_id': Item.merchant_id,
+    'city': Merchant.city,
+    'state': Merchant.state,
+}
+FACET_SIZE = 10
+# Ranking scores every match, deep pages don't get cheaper: cap them
+MAX_OFFSET = 10000
+# Weights of the name and description, as ts_rank's defaults for A and B
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+
+def _float_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        abort(400, description=f'{name} must be a number.')
+
+
+def _ids_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return [int(v) for v in value.split(',') if v.strip()]
+    except ValueError:
+        abort(400, description=f'{name} must be a list of integers.')
+
+
+def _facets_arg():
+    value = request.args.get('facets')
+    if value is None:
+        return ()
+    names = tuple(n.strip() for n in value.split(',') if n.strip())
+    unknown = [n for n in names if n not in FACETS]
+    if unknown:
+        abort(400, description='Unknown facets: {}. Allowed: {}.'.format(
+            ', '.join(unknown), ', '.join(FACETS)))
+    return names
+
+
+def search_args():
+    '''Returns (q, filters, facets) of a search request'''
+    q = request.args.get('q', '').strip()
+    if not q:
+        abort(400, description='q is required.')
+    filters = {
+        'price_min': _float_arg('price_min'),
+        'price_max': _float_arg('price_max'),
+        'merchant_id': _ids_arg('merchant_id'),
+        'city': request.args.get('city'),
+        'state': request.args.get('state'),
+    }
+    return q, filters, _facets_arg()
+
+
+def apply_filters(stmt, filters, facets=()):
+    '''Adds the filters, and the join to merchants when needed'''
+    stmt = stmt.select_from(Item)
+    if filters['price_min'] is not None:
+        stmt = stmt.where(Item.price >= filters['price_min'])
+    if filters['price_max'] is not None:
+        stmt = stmt.where(Item.price <= filters['price_max'])
+    if filters['merchant_id']:
+        stmt = stmt.where(Item.merchant_id.in_(filters['merchant_id']))
+    if filters['city'] or filters['state'] or \
+            set(facets) & {'city', 'state'}:
+        stmt = stmt.join(Merchant, Merchant.id == Item.merchant_id)
+    if filters['city']:
+        stmt = stmt.where(Merchant.city == filters['city'])
+    if filters['state']:
+        stmt = stmt.where(Merchant.state == filters['state'])
+    return stmt
+
+
+def _count_facets(values_by_facet):
+    '''{facet: [values]} to {facet: [{'value', 'count'}]}, most common'''
+    counted = {}
+    for facet, values in values_by_facet.items():
+        counts = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        top = sorted(counts.items(), key=lambda kv: (-kv[1], str(kv[0])))
+        counted[facet] = [{'value': value, 'count': count}
+                          for value, count in top[:FACET_SIZE]]
+    return counted
+
+
+'''
+MemorySearchIndex
+    In-process inverted index over item names and descriptions, for
+    databases without full-text search. Words are lowercased with a
+    crude plural stemming; a query matches the items containing all of
+    its words, scored by where the words appear.
+'''
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    words = []
+    for word in WORD.findall((text or '').lower()):
+        if len(word) > 3 and word.endswith('s') and \
+                not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+class MemorySearchIndex(object):
+    def __init__(self):
+        self._postings = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def build(self, rows):
+        '''Index (id, name, description) rows'''
+        postings = {}
+        for item_id, name, description in rows:
+            for text, weight in ((name, NAME_WEIGHT),
+                                 (description, DESCRIPTION_WEIGHT)):
+                for word in tokenize(text):
+                    scores = postings.setdefault(word, {})
+                    scores[item_id] = scores.get(item_id, 0) + weight
+        return postings
+
+    def postings(self):
+        with self._lock:
+            if self._postings is None:
+                self._postings = self.build(db.session.execute(
+                    select(Item.id, Item.name, Item.description)))
+            return self._postings
+
+    def search(self, q):
+        '''Returns {item id: score} of the items matching all words'''
+        postings = self.postings()
+        scores = None
+        for word in set(tokenize(q)):
+            matches = postings.get(word, {})
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {item_id: score + matches[item_id]
+                          for item_id, score in scores.items()
+                          if item_id in matches}
+            if not scores:
+                return {}
+        return scores or {}
+
+
+def get_search_index():
+    if not has_app_context():
+        return None
+    return current_app.extensions.setdefault(
+        'search_index', MemorySearchIndex())
+
+
+def invalidate_search_index(tables):
+    if 'items' in tables:
+        index = get_search_index()
+        if index is not None:
+            index.invalidate()
+
+
+table_change_listeners.append(invalidate_search_index)
+
+
+'''
+search_items(fields)
+    Runs the search of the current request and returns
+    (rows, next_cursor, facets), rows being (id, *fields, rank) tuples
+'''
+
+
+def search_items(fields):
+    q, filters, facets = search_args()
+    paging = page_args()
+    if paging is None:
+        paging = (current_app.config['DEFAULT_PAGE_SIZE'], None)
+    limit, offset = paging[0], paging[1] or 0
+    if offset > MAX_OFFSET:
+        abort(400, description=f'after must be at most {MAX_OFFSET}.')
+
+    columns = [Item.id] + [getattr(Item, field) for field in fields]
+    if db.engine.dialect.name == 'postgresql':
+        rows, facet_counts = _search_postgres(
+            q, filters, facets, columns, limit, offset)
+    else:
+        rows, facet_counts = _search_memory(
+            q, filters, facets, columns, limit, offset)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = offset + limit
+    return rows, next_cursor, facet_counts
+
+
+def _search_postgres(q, filters, facets, columns, limit, offset):
+    query = func.websearch_to_tsquery('english', q)
+    document = item_search_document()
+    matches = document.op('@@')(query)
+    rank = func.ts_rank_cd(document, query).label('rank')
+
+    stmt = apply_filters(select(*columns, rank), filters).where(matches)
+    rows = db.session.execute(stmt.order_by(rank.desc(), Item.id)
+                              .offset(offset).limit(limit + 1)).all()
+
+    facet_counts = {}
+    for facet in facets:
+        column = FACETS[facet]
+        count = func.count().label('count')
+        facet_stmt = apply_filters(select(column, count), filters, (facet,)) \
+            .where(matches).group_by(column) \
+            .order_by(count.desc(), column).limit(FACET_SIZE)
+        facet_counts[facet] = [
+            {'value': value, 'count': n}
+            for value, n in db.session.execute(facet_stmt)]
+    return rows, facet_counts
+
+
+def _search_memory(q, filters, facets, columns, limit, offset):
+    scores = get_search_index().search(q)
+    if not scores:
+        return [], {facet: [] for facet in facets}
+
+    facet_columns = [FACETS[facet] for facet in facets]
+    stmt = apply_filters(select(*columns, *facet_columns), filters, facets)
+    width = len(columns)
+    matched = [row for row in db.session.execute(stmt)
+               if row[0] in scores]
+    matched.sort(key=lambda row: (-scores[row[0]], row[0]))
+
+    facet_counts = _count_facets({
+        facet: [row[width + i] for row in matched]
+        for i, facet in enumerate(facets)})
+    rows = [tuple(row[:width]) + (scores[row[0]],)
+            for row in matched[offset:offset + limit + 1]]
+    return rows, facet_counts
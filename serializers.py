@@ -0,0 +1,66 @@
+import json
+from flask import Response, current_app
+from timing import timed
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used instead
+    orjson = None
+
+'''
+Serializers
+    JSON encoding for API responses goes through a pluggable backend:
+    orjson when it is installed, the stdlib json module otherwise.
+    JSON_BACKEND in the config picks one explicitly ('auto' by default).
+    Every backend takes an object and returns UTF-8 encoded bytes.
+'''
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj)
+
+
+BACKENDS = {'stdlib': _stdlib_dumps}
+if orjson is not None:
+    BACKENDS['orjson'] = _orjson_dumps
+
+
+def register_backend(name, dumps):
+    BACKENDS[name] = dumps
+
+
+def get_dumps(name=None):
+    if name is None:
+        name = current_app.config.get('JSON_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in BACKENDS else 'stdlib'
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f'Unknown JSON backend: {name}')
+
+
+def json_response(obj, status=200):
+    with timed('serialize'):
+        body = get_dumps()(obj)
+    return Response(body, status=status, mimetype='application/json')
+
+
+'''
+Row serializers
+    Read-only listings select plain column tuples with Core instead of
+    ORM instances; row_formatter turns them into dicts without going
+    through the identity map or format().
+'''
+
+
+def row_formatter(keys):
+    keys = tuple(keys)
+
+    def format_row(row):
+        return dict(zip(keys, row))
+    return format_row
@@ -0,0 +1,68 @@
+from flask import Response, abort, current_app, request, stream_with_context
+from sqlalchemy.orm import Query
+from models import db
+from serializers import get_dumps
+
+'''
+Streaming collection exports
+    `?stream=ndjson` writes one JSON object per line,
+    `?stream=json` writes the usual {"success": true, "<name>": [...]}
+    document as a chunked array.
+    Rows are read from the database in batches through a server-side
+    cursor (yield_per) and written out as soon as they are serialized,
+    so worker memory stays flat whatever the size of the table.
+'''
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+
+def stream_format():
+    '''Returns the requested stream format, or None for a regular response'''
+    fmt = request.args.get('stream')
+    if fmt is None:
+        return None
+    if fmt not in STREAM_FORMATS:
+        abort(400, description='stream must be one of: {}.'.format(
+            ', '.join(STREAM_FORMATS)))
+    if 'limit' in request.args:
+        abort(400, description='stream cannot be combined with limit.')
+    return fmt
+
+
+def iter_rows(query, column, after=None, batch_size=None):
+    if batch_size is None:
+        batch_size = current_app.config['STREAM_BATCH_SIZE']
+    if after is not None:
+        query = query.filter(column > after)
+    query = query.order_by(column).execution_options(stream_results=True)
+    if isinstance(query, Query):
+        return query.yield_per(batch_size)
+    return db.session.execute(query).yield_per(batch_size)
+
+
+def ndjson_chunks(rows, format_row, dumps):
+    for row in rows:
+        yield dumps(format_row(row)) + b'\n'
+
+
+def json_array_chunks(rows, name, format_row, dumps):
+    yield b'{"success":true,"%s":[' % name.encode('utf-8')
+    separator = b''
+    for row in rows:
+        yield separator + dumps(format_row(row))
+        separator = b','
+    yield b']}\n'
+
+
+def stream_response(query, column, name, fmt, format_row, after=None):
+    rows = iter_rows(query, column, after)
+    dumps = get_dumps()
+    if fmt == 'ndjson':
+        chunks = ndjson_chunks(rows, format_row, dumps)
+    else:
+        chunks = json_array_chunks(rows, name, format_row, dumps)
+    return Response(stream_with_context(chunks),
+                    mimetype=STREAM_FORMATS[fmt])
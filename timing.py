@@ -0,0 +1,153 @@
+import logging
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, has_request_context
+from flask import request
+from flask.json import JSONEncoder
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import request_metrics
+
+'''
+Request timing
+    init_timing(app) times every request and splits the time into
+    phases:
+        auth        verifying the JWT (verify_decode_jwt; cache hits
+                    cost next to nothing)
+        db          executing SQL statements, with their number
+        serialize   encoding JSON responses
+        total       wall time from before_request to after_request
+    The phases are sent back in a Server-Timing header, which browser
+    dev tools display, and aggregated per endpoint into the histograms
+    served at /metrics.
+
+    Streamed responses are encoded after after_request, their
+    serialization and the queries of later batches are not counted.
+
+Slow query log
+    Statements that take longer than SLOW_QUERY_MS are logged to the
+    `sideboard.slow_queries` logger with their duration. Parameters may
+    hold personal data (emails, names): only their types are logged.
+'''
+
+slow_query_logger = logging.getLogger('sideboard.slow_queries')
+
+PHASES = ('auth', 'db', 'serialize')
+
+
+class RequestTimer(object):
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total):
+        '''Value of the Server-Timing header, durations in milliseconds'''
+        entries = []
+        for phase in PHASES:
+            entry = f'{phase};dur={self.phases[phase] * 1000:.2f}'
+            if phase == 'db':
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def current_timer():
+    if has_request_context():
+        return g.get('request_timer')
+    return None
+
+
+@contextmanager
+def timed(phase):
+    '''Adds the time spent in the block to `phase` of the request'''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer = current_timer()
+        if timer is not None:
+            timer.add(phase, time.perf_counter() - start)
+
+
+class TimedJSONEncoder(JSONEncoder):
+    '''jsonify's encoder, counting its time as serialization'''
+
+    def encode(self, o):
+        with timed('serialize'):
+            return super().encode(o)
+
+
+def init_timing(app):
+    app.json_encoder = TimedJSONEncoder
+
+    @app.before_request
+    def start_timer():
+        g.request_timer = RequestTimer()
+
+    @app.after_request
+    def record_timing(response):
+        timer = g.pop('request_timer', None)
+        if timer is None:
+            return response
+        total = timer.total()
+        response.headers['Server-Timing'] = timer.server_timing(total)
+        request_metrics.observe(request.endpoint or 'unmatched', total,
+                                timer.phases, timer.queries)
+        return response
+
+
+'''
+SQL statements
+    Timed with the cursor events of every engine, the start time being
+    kept on the connection.
+'''
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    conn.info['statement_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_statement(conn, cursor, statement, parameters, context,
+                  executemany):
+    elapsed = time.perf_counter() - conn.info['statement_start']
+    timer = current_timer()
+    if timer is not None:
+        timer.queries += 1
+        timer.add('db', elapsed)
+    if has_app_context():
+        threshold = current_app.config.get('SLOW_QUERY_MS')
+        if threshold is not None and elapsed * 1000 >= threshold:
+            log_slow_query(statement, parameters, elapsed, executemany)
+
+
+def redact(parameters):
+    '''The parameters with each value replaced by its type name'''
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(redact(value) for value in parameters)
+    if parameters is None:
+        return None
+    return f'<{type(parameters).__name__}>'
+
+
+def log_slow_query(statement, parameters, elapsed, executemany=False):
+    if executemany:
+        parameters = f'<{len(parameters)} parameter sets>'
+    else:
+        parameters = redact(parameters)
+    slow_query_logger.warning(
+        'Slow query (%.1f ms) on %s: %s parameters: %s', elapsed * 1000,
+        request.endpoint if has_request_context() else '-',
+        ' '.join(statement.split()), parameters)
@@ -0,0 +1,110 @@
+from sqlalchemy import Float, Integer, String, select
+from models import db
+
+'''
+Row validation
+    Checks request bodies against a model's writable columns
+    (model.FIELDS) and the column types in its table, so a whole batch
+    can be validated in one pass before anything touches the database.
+    Errors are returned as {field: message} dicts.
+'''
+
+
+def _coerce(column, value):
+    if value is None:
+        if not column.nullable:
+            raise ValueError('may not be null')
+        return None
+    if isinstance(column.type, String):
+        if isinstance(value, (dict, list, bool)):
+            raise ValueError('must be a string')
+        value = str(value)
+        if column.type.length and len(value) > column.type.length:
+            raise ValueError(
+                f'must be at most {column.type.length} characters')
+        return value
+    if isinstance(column.type, Integer):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError('must be an integer')
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError('must be an integer')
+    if isinstance(column.type, Float):
+        if isinstance(value, bool) or \
+                not isinstance(value, (int, float, str)):
+            raise ValueError('must be a number')
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError('must be a number')
+    return value
+
+
+def validate_row(model, data, partial_update=False):
+    '''
+    Returns (values, errors) for one object of `model`. With
+    partial_update only the given fields are checked (PATCH), otherwise
+    every required column must be present.
+    '''
+    if not isinstance(data, dict):
+        return None, {'': 'must be an object'}
+
+    columns = model.__table__.columns
+    values = {}
+    errors = {}
+    for field, value in data.items():
+        if field not in model.FIELDS:
+            errors[field] = 'unknown field'
+            continue
+        try:
+            values[field] = _coerce(columns[field], value)
+        except ValueError as e:
+            errors[field] = str(e)
+
+    if not partial_update:
+        for field in model.FIELDS:
+            if field not in data and not columns[field].nullable and \
+                    columns[field].default is None and \
+                    columns[field].server_default is None:
+                errors[field] = 'is required'
+    return values, errors
+
+
+def check_constraints(model, rows, errors):
+    '''
+    Batch checks of unique and foreign key constraints for the rows
+    that passed validation, with one query per constrained column.
+    Adds to `errors` (index -> {field: message}) in place.
+    '''
+    table = model.__table__
+    valid = [(i, row) for i, row in enumerate(rows) if i not in errors]
+
+    for column in table.columns:
+        if not column.unique or column.primary_key:
+            continue
+        values = {row[column.key] for i, row in valid
+                  if row.get(column.key) is not None}
+        taken = set(db.session.execute(
+            select(column).where(column.in_(values))).scalars()) \
+            if values else set()
+        seen = set()
+        for i, row in valid:
+            value = row.get(column.key)
+            if value in taken or value in seen:
+                errors.setdefault(i, {})[column.key] = 'already exists'
+            elif value is not None:
+                seen.add(value)
+
+    for fk in table.foreign_keys:
+        parent = fk.parent
+        values = {row[parent.key] for i, row in valid
+                  if row.get(parent.key) is not None}
+        found = set(db.session.execute(
+            select(fk.column).where(fk.column.in_(values))).scalars()) \
+            if values else set()
+        for i, row in valid:
+            value = row.get(parent.key)
+            if value is not None and value not in found:
+                errors.setdefault(i, {})[parent.key] = 'does not exist'
+    return errors